@@ -1,13 +1,50 @@
-from typing import List
-from graph import LoRState, VerifiedFact
-from langchain_openai import ChatOpenAI
+from typing import Dict, List, Optional
+from graph import LETTER_STREAM_TAG, LoRState, VerifiedFact
+from cache import fact_cache_key, get_cache, sentence_cache_key, verification_cache_key
+from chunking import merge_facts, split_materials
+from facts import citations, fact_store, normalize_citations, strip_citations
+from support import partition_cited, split_sentences
+import prompts
+from backends import create_llm
+from resilience import StructuredOutputError, request_timeout, resilient_structured, resilient_text
+from telemetry import current_trace
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.runnables import RunnableParallel
 from pydantic import BaseModel
 import os
+import re
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
+# Upper bound on draft -> verify -> revise rounds before the letter is returned as-is
+MAX_REVISIONS = int(os.getenv("LOR_MAX_REVISIONS", "2"))
+
+# Maximum chunk extractions in flight at once for long materials
+EXTRACTION_CONCURRENCY = int(os.getenv("LOR_EXTRACTION_CONCURRENCY", "4"))
+
+# First drafts written concurrently in speculative mode; the lowest-risk one is kept (1 disables it)
+SPECULATIVE_DRAFTS = int(os.getenv("LOR_SPECULATIVE_DRAFTS", "1"))
+
+# Sampling temperatures cycled over the extra speculative drafts; the first uses the client's own
+SPECULATIVE_TEMPERATURES = [float(t) for t in os.getenv("LOR_SPECULATIVE_TEMPERATURES", "0.7,1.0").split(",")]
+
+# Smaller models for the extraction and verification nodes; drafting always uses the selected
+# model, which these nodes escalate to when the small model's output looks unreliable.
+# An empty value runs the node on the selected model.
+NODE_MODELS = {
+    "fact_extraction": os.getenv("LOR_EXTRACTION_MODEL", "gpt-4o-mini"),
+    "verify": os.getenv("LOR_VERIFICATION_MODEL", "gpt-4o-mini"),
+}
+
+# Escalate an extraction chunk when at least this share of its facts are low-confidence
+ESCALATION_LOW_CONFIDENCE = float(os.getenv("LOR_ESCALATION_LOW_CONFIDENCE", "0.5"))
+
+# Verdicts that send a letter back for revision, and their order when choosing between drafts
+REVISE_RISKS = ("medium", "high")
+RISK_RANK = {"low": 0, "medium": 1, "high": 2}
+
 # Wrapper class for structured output
 class FactsList(BaseModel):
     facts: List[VerifiedFact]
@@ -16,164 +53,409 @@ class VerificationResult(BaseModel):
     hallucination_risk: str  # "low", "medium", or "high"
     unsupported_sentences: List[str]
 
-def create_agents_with_api_key(api_key: str = None, language: str = "English"):
-    """Create agents with the provided API key and language"""
-    # Use provided API key or fall back to environment variable
-    key = api_key or os.getenv("OPENAI_API_KEY")
+def format_facts(facts: List[VerifiedFact]) -> str:
+    """Facts as an "[F#] claim (evidence, confidence)" prompt block, cached per fact set"""
+    return fact_store(facts).render()
+
+def node_models(model: str) -> Dict[str, str]:
+    """Node -> model for the nodes that run on a different model than ``model``"""
+    return {node: node_model for node, node_model in NODE_MODELS.items() if node_model and node_model != model}
+
+def extraction_escalation(response: FactsList) -> Optional[str]:
+    """Reason to re-extract a chunk with the larger model, if any"""
+    facts = response.facts
+    if not facts or sum(f.confidence == "low" for f in facts) >= ESCALATION_LOW_CONFIDENCE * len(facts):
+        return "low_confidence"
+    return None
+
+def verification_escalation(response: VerificationResult) -> Optional[str]:
+    """Reason to re-verify with the larger model: a borderline or unrecognized verdict"""
+    if response.hallucination_risk not in RISK_RANK:
+        return "invalid_verdict"
+    if response.hallucination_risk == "medium":
+        return "borderline"
+    return None
+
+def _normalize_whitespace(text: str) -> str:
+    return re.sub(r"\s+", " ", text).strip()
+
+def split_paragraphs(letter: str) -> List[str]:
+    """Split a letter into paragraphs, keeping the blank-line separators as their own items"""
+    return re.split(r"(\n\s*\n)", letter)
+
+def flagged_paragraphs(parts: List[str], sentences: List[str]) -> dict:
+    """Map paragraph index -> flagged sentences found in that paragraph, ignoring fact citations"""
+    flagged = {}
+    plain_parts = [_normalize_whitespace(strip_citations(part)) for part in parts]
+    for sentence in sentences:
+        needle = _normalize_whitespace(strip_citations(sentence))
+        if not needle:
+            continue
+        for i, part in enumerate(plain_parts):
+            if needle in part:
+                flagged.setdefault(i, []).append(sentence)
+                break
+    return flagged
+
+def create_agent_nodes(api_key: str = None, language: str = "English", model: str = "gpt-4o",
+                       llm: BaseChatModel = None, speculative_drafts: int = None,
+                       node_llms: Dict[str, BaseChatModel] = None) -> dict:
+    """Map node name -> (sync agent, async agent), plus the "decision" router.
+
+    Both variants share prompt construction and state updates; the async ones
+    call the LLM with ainvoke/abatch/astream so many runs can share one event loop.
+    With more than one ``speculative_drafts`` a "speculate" node is included
+    that writes and verifies that many first drafts concurrently.
+
+    ``node_llms`` maps "fact_extraction" / "verify" to smaller clients that
+    those nodes try first, escalating to ``llm`` on parse failures,
+    low-confidence facts or borderline verdicts. Without an ``llm`` they are
+    created from NODE_MODELS; with one, nodes missing from ``node_llms`` use it.
+    """
+    if llm is None:
+        llm = create_llm(api_key, model, timeout=request_timeout())
+        if node_llms is None:
+            node_llms = {node: create_llm(api_key, node_model, timeout=request_timeout(node))
+                         for node, node_model in node_models(model).items()}
+    node_llms = node_llms or {}
+    if speculative_drafts is None:
+        speculative_drafts = SPECULATIVE_DRAFTS
+
+    # Fact extraction results are reused across runs with the same materials
+    facts_cache = get_cache("facts")
+
+    def describe(client, default: str) -> str:
+        # The backend is part of the name, so a fake backend run never serves its canned
+        # facts and verdicts to a real one sharing the cache file
+        backend = getattr(client, "_llm_type", type(client).__name__)
+        return f"{backend}:{getattr(client, 'model_name', default)}"
+
+    def cache_model(node: str) -> str:
+        # Cached results are keyed on every model that can produce them, so changing
+        # a node's small model (e.g. LOR_EXTRACTION_MODEL) never serves stale entries
+        small = node_llms.get(node)
+        large = describe(llm, model)
+        return f"{large}+{describe(small, model)}" if small is not None else large
+
+    # Full drafts are tagged so callers can stream their tokens to the user. Every call
+    # goes through resilience.py: per-node deadlines, jittered retries and hedging
+    letter_llm = llm.with_config(tags=[LETTER_STREAM_TAG])
+    draft_llm = resilient_text("draft", letter_llm, stream=True)
+    repair_llm = resilient_text("draft", llm, name="draft_repair")
+
+    def count(event: str, n: int = 1) -> None:
+        trace = current_trace()
+        if trace is not None and n:
+            trace.count(event, n)
+
+    def tiered(node: str, schema, escalation):
+        """Sync and async batch callers for a structured node, small model first.
+
+        Responses the small model fails on (after local repair and retries), or
+        that ``escalation`` gives a reason for, are retried as one batch on the
+        larger model.
+        """
+        large = resilient_structured(node, llm, schema)
+        if node not in node_llms:
+            return large.batch, large.abatch
+        small = resilient_structured(node, node_llms[node], schema, name=f"{node}_small", retry_parse_failures=False)
+
+        def triage(responses: list):
+            """Parsed results and the indices to retry on the larger model"""
+            results, retry = [], []
+            for i, response in enumerate(responses):
+                if isinstance(response, StructuredOutputError):
+                    reason = "parse_failure"
+                elif isinstance(response, Exception):
+                    reason = "error"
+                else:
+                    reason = escalation(response)
+                if reason is not None:
+                    count(f"{node}_escalated_{reason}")
+                    retry.append(i)
+                results.append(response)
+            count(f"{node}_small_model_calls", len(responses))
+            return results, retry
+
+        def batch(inputs: list, config=None) -> list:
+            results, retry = triage(small.batch(inputs, config=config, return_exceptions=True))
+            if retry:
+                for i, result in zip(retry, large.batch([inputs[i] for i in retry], config=config)):
+                    results[i] = result
+            return results
+
+        async def abatch(inputs: list, config=None) -> list:
+            results, retry = triage(await small.abatch(inputs, config=config, return_exceptions=True))
+            if retry:
+                for i, result in zip(retry, await large.abatch([inputs[i] for i in retry], config=config)):
+                    results[i] = result
+            return results
+
+        return batch, abatch
+
+    extract_batch, aextract_batch = tiered("fact_extraction", FactsList, extraction_escalation)
+    extraction_config = {"max_concurrency": EXTRACTION_CONCURRENCY}
+
+    def cached_facts(state: LoRState):
+        cache_key = fact_cache_key(state['raw_materials'], language, cache_model("fact_extraction"))
+        cached = facts_cache.get(cache_key)
+        return cache_key, (FactsList.model_validate_json(cached).facts if cached is not None else None)
+
+    def extraction_prompts(state: LoRState) -> list:
+        # Map: one extraction per chunk of the materials
+        return [prompts.extraction_messages(language, chunk) for chunk in split_materials(state['raw_materials'])]
+
+    def set_facts(state: LoRState, facts: List[VerifiedFact]) -> LoRState:
+        # Render the facts block once; drafting, repair and verification all reuse it
+        state["verified_facts"] = facts
+        state["facts_text"] = format_facts(facts)
+        return state
 
-    llm = ChatOpenAI(
-        model="gpt-4o",
-        temperature=0.3,
-        api_key=key
-    )
+    def store_facts(state: LoRState, cache_key: str, responses: List[FactsList]) -> LoRState:
+        # Reduce: merge near-duplicate facts across chunks
+        response = FactsList(facts=merge_facts([r.facts for r in responses]))
+        facts_cache.set(cache_key, response.model_dump_json())
+        return set_facts(state, response.facts)
 
     def fact_extraction_agent(state: LoRState) -> LoRState:
-        if language == "English":
-            prompt = f"""
-            You are extracting ONLY verifiable facts for a recommendation letter.
-
-            Raw materials:
-            {state['raw_materials']}
-
-            Extract factual claims with supporting evidence.
-            Do NOT infer or exaggerate.
-            Return a JSON list of facts with the following structure:
-            - claim: the factual claim
-            - evidence: supporting evidence from the raw materials
-            - confidence: high, medium, or low
-            """
-        else:  # 繁體中文
-            prompt = f"""
-            您正在為推薦信提取可驗證的事實。
-
-            原始資料：
-            {state['raw_materials']}
-
-            提取事實性聲明及其支持證據。
-            不要推斷或誇大。
-            請以以下結構返回 JSON 事實列表：
-            - claim: 事實性聲明
-            - evidence: 來自原始資料的支持證據
-            - confidence: high（高）、medium（中）或 low（低）
-            """
-
-        response = llm.with_structured_output(FactsList).invoke(prompt)
-
-        state["verified_facts"] = response.facts
+        cache_key, facts = cached_facts(state)
+        if facts is not None:
+            return set_facts(state, facts)
+        responses = extract_batch(extraction_prompts(state), config=extraction_config)
+        return store_facts(state, cache_key, responses)
+
+    async def afact_extraction_agent(state: LoRState) -> LoRState:
+        cache_key, facts = cached_facts(state)
+        if facts is not None:
+            return set_facts(state, facts)
+        responses = await aextract_batch(extraction_prompts(state), config=extraction_config)
+        return store_facts(state, cache_key, responses)
+
+    def set_draft(state: LoRState, text: str) -> LoRState:
+        # Verification and revision work on the cited draft; the user sees it without citations
+        state["cited_draft"] = normalize_citations(text)
+        state["draft_letter"] = strip_citations(state["cited_draft"])
         return state
 
-    def drafting_agent(state: LoRState) -> LoRState:
-        facts_text = "\n".join(
-            f"- {f.claim} (evidence: {f.evidence}, confidence: {f.confidence})"
-            for f in state["verified_facts"]
+    def revision_plan(state: LoRState, facts_text: str):
+        """Paragraphs to repair and their prompts, or None if no flagged sentence can be located"""
+        parts = split_paragraphs(state.get("cited_draft") or state["draft_letter"])
+        flagged = flagged_paragraphs(parts, state["unsupported_sentences"])
+        if not flagged:
+            return None
+        indices = sorted(flagged)
+        messages = [prompts.repair_messages(language, facts_text, parts[i].strip(), flagged[i]) for i in indices]
+        return parts, indices, messages
+
+    def splice(parts: List[str], indices: List[int], responses) -> str:
+        for i, response in zip(indices, responses):
+            parts[i] = response.content.strip()
+        return "".join(parts)
+
+    def draft_prompt(state: LoRState, facts_text: str):
+        return prompts.draft_messages(
+            language, facts_text, state['recommender_role'], state['candidate_name'], state['target_program']
         )
 
-        if language == "English":
-            prompt = f"""
-            You are a {state['recommender_role']} writing a recommendation letter
-            for {state['candidate_name']} who is applying to {state['target_program']}.
-
-            IMPORTANT RULES:
-            1. You may ONLY use the verified facts listed below
-            2. Do NOT add any information not explicitly stated in the facts
-            3. Do NOT exaggerate or make inferences beyond what is stated
-            4. Write in a formal, professional tone appropriate for an academic recommendation letter
-            5. Include proper letter formatting (date, salutation, body, closing)
-
-            Verified facts you can use:
-            {facts_text}
-
-            Write a complete, formal recommendation letter that:
-            - Opens with your relationship to the candidate
-            - Discusses specific achievements and qualities (based only on the facts)
-            - Provides concrete examples from the verified facts
-            - Concludes with a strong recommendation
-            - Maintains a professional and sincere tone throughout
-
-            Format the letter properly with appropriate sections and paragraphs.
-            """
-        else:  # 繁體中文
-            prompt = f"""
-            您是一位{state['recommender_role']}，正在為{state['candidate_name']}撰寫推薦信，
-            該候選人正在申請{state['target_program']}。
-
-            重要規則：
-            1. 您只能使用以下列出的已驗證事實
-            2. 不要添加任何未在事實中明確說明的資訊
-            3. 不要誇大或做出超出所述內容的推論
-            4. 使用適合學術推薦信的正式、專業語氣
-            5. 包含適當的信件格式（日期、稱呼、正文、結語）
-
-            您可以使用的已驗證事實：
-            {facts_text}
-
-            請撰寫一封完整、正式的推薦信，包含：
-            - 開頭說明您與候選人的關係
-            - 討論具體成就和品質（僅基於事實）
-            - 從已驗證的事實中提供具體例子
-            - 以強烈的推薦作為結尾
-            - 始終保持專業和真誠的語氣
-
-            請以適當的段落正確格式化信件。請用臺灣繁體中文撰寫整封推薦信。
-            """
-
-        state["draft_letter"] = llm.invoke(prompt).content
-        return state
+    def is_revision(state: LoRState) -> bool:
+        # Every pass back into draft after a verdict counts against MAX_REVISIONS,
+        # including flagged verdicts that name no sentences (a full redraft follows)
+        if state.get("draft_letter") and state.get("hallucination_risk") is not None:
+            state["revision_count"] = state.get("revision_count", 0) + 1
+            return True
+        return False
 
-    def verification_agent(state: LoRState) -> LoRState:
-        facts_text = "\n".join(
-            f"- {f.claim} (evidence: {f.evidence}, confidence: {f.confidence})"
-            for f in state["verified_facts"]
+    def drafting_agent(state: LoRState) -> LoRState:
+        facts_text = state.get("facts_text") or format_facts(state["verified_facts"])
+
+        # Repair only the paragraphs that contain unsupported sentences
+        plan = revision_plan(state, facts_text) if is_revision(state) else None
+        if plan is not None:
+            parts, indices, messages = plan
+            return set_draft(state, splice(parts, indices, repair_llm.batch(messages)))
+
+        # First draft, or flagged sentences could not be located: write the full letter
+        prompt = draft_prompt(state, facts_text)
+        return set_draft(state, draft_llm.invoke(prompt).content)
+
+    async def adrafting_agent(state: LoRState) -> LoRState:
+        facts_text = state.get("facts_text") or format_facts(state["verified_facts"])
+
+        plan = revision_plan(state, facts_text) if is_revision(state) else None
+        if plan is not None:
+            parts, indices, messages = plan
+            return set_draft(state, splice(parts, indices, await repair_llm.abatch(messages)))
+
+        prompt = draft_prompt(state, facts_text)
+        return set_draft(state, (await draft_llm.ainvoke(prompt)).content)
+
+    verify_batch, averify_batch = tiered("verify", VerificationResult, verification_escalation)
+
+    # Verdicts are cached per letter, and per sentence so a revised letter only
+    # sends its new or changed sentences to the LLM
+    verification_cache = get_cache("verification")
+    sentence_cache = get_cache("verification_sentences")
+
+    def combine(response: Optional[VerificationResult], known: Dict[str, str]) -> VerificationResult:
+        """Merge the LLM's verdict with sentences already known to be unsupported (sentence -> risk)"""
+        risks = list(known.values()) + ([response.hallucination_risk] if response is not None else [])
+        unsupported = list(known) + [s for s in (response.unsupported_sentences if response else []) if s not in known]
+        return VerificationResult(
+            hallucination_risk=max(risks, key=lambda r: RISK_RANK.get(r, len(RISK_RANK)), default="low"),
+            unsupported_sentences=unsupported
         )
 
-        if language == "English":
-            prompt = f"""
-            You are verifying a recommendation letter against verified facts.
-
-            Verified facts:
-            {facts_text}
-
-            Letter:
-            {state['draft_letter']}
-
-            Your task:
-            1. Check each sentence in the letter against the verified facts
-            2. Identify any sentences that make claims not supported by the facts
-            3. Determine the overall hallucination risk level
-
-            Return:
-            - hallucination_risk: "low" (if all claims are supported), "medium" (if some minor unsupported claims), or "high" (if major unsupported claims)
-            - unsupported_sentences: list of sentences that are not supported by the verified facts
-            """
-        else:  # 繁體中文
-            prompt = f"""
-            您正在對照已驗證的事實來驗證推薦信。
-
-            已驗證的事實：
-            {facts_text}
-
-            推薦信：
-            {state['draft_letter']}
-
-            您的任務：
-            1. 將信中的每個句子與已驗證的事實進行對照
-            2. 識別任何未被事實支持的聲明句子
-            3. 確定整體的幻覺風險等級
-
-            返回：
-            - hallucination_risk: "low"（如果所有聲明都有支持）、"medium"（如果有一些小的不支持的聲明）或 "high"（如果有重大的不支持的聲明）
-            - unsupported_sentences: 未被已驗證事實支持的句子列表
-            """
-
-        result = llm.with_structured_output(VerificationResult).invoke(prompt)
+    def memoize(pending: Dict[str, str], response: VerificationResult) -> None:
+        """Cache the LLM's verdict for each sentence it checked (sentence -> cache key)"""
+        flagged = {_normalize_whitespace(s) for s in response.unsupported_sentences}
+        checked = {_normalize_whitespace(s) for s in pending}
+        if not flagged <= checked or (not flagged and response.hallucination_risk != "low"):
+            # The verdict cannot be attributed sentence by sentence
+            return
+        flagged_risk = response.hallucination_risk if response.hallucination_risk in REVISE_RISKS else "medium"
+        for sentence, key in pending.items():
+            sentence_cache.set(key, flagged_risk if _normalize_whitespace(sentence) in flagged else "supported")
+
+    def verification_plan(state: LoRState):
+        """Prompt for the sentences the LLM has to check (None when there are none),
+        and a function turning its response into the letter's verdict"""
+        store = fact_store(state["verified_facts"])
+        letter = state.get("cited_draft") or state["draft_letter"]
+        letter_key = verification_cache_key(letter, store.digest, language, cache_model("verify"))
+        cached = verification_cache.get(letter_key)
+        if cached is not None:
+            count("verification_letter_hits")
+            result = VerificationResult.model_validate_json(cached)
+            return None, lambda response: result
+
+        # Sentences citing fact IDs that do not exist are unsupported without asking the LLM
+        cited_ids, known = {}, {}
+        for sentence in split_sentences(letter):
+            ids = citations(sentence)
+            if all(fact_id in store for fact_id in ids):
+                cited_ids[strip_citations(sentence)] = ids
+            else:
+                known[strip_citations(sentence)] = "medium"
+
+        # Sentences that closely restate a fact they cite (or, if uncited, any fact) pass
+        # locally; only the rest go to the LLM
+        sentences = list(cited_ids)
+        _, ambiguous = partition_cited(
+            sentences, [[store.index_of(fact_id) for fact_id in cited_ids[s]] for s in sentences], list(store)
+        )
 
+        # Sentences judged before against the same facts reuse their verdict
+        pending = {}
+        for sentence in ambiguous:
+            key = sentence_cache_key(sentence, cited_ids[sentence], store.digest, language,
+                                     cache_model("verify"))
+            verdict = sentence_cache.get(key)
+            if verdict is None:
+                pending[sentence] = key
+            elif verdict != "supported":
+                known[sentence] = verdict
+        count("verification_sentences_reused", len(ambiguous) - len(pending))
+        count("verification_sentences_checked", len(pending))
+
+        def finish(response: Optional[VerificationResult]) -> VerificationResult:
+            if response is not None:
+                memoize(pending, response)
+            result = combine(response, known)
+            verification_cache.set(letter_key, result.model_dump_json())
+            return result
+
+        if not pending:
+            return None, finish
+
+        # When every remaining sentence cites its sources, only those facts are sent
+        if all(cited_ids[s] for s in pending):
+            facts_text = store.render(fact_id for s in pending for fact_id in cited_ids[s])
+        else:
+            facts_text = state.get("facts_text") or store.render()
+        return prompts.verification_messages(language, facts_text, list(pending)), finish
+
+    def apply_verification(state: LoRState, result: VerificationResult) -> LoRState:
         state["hallucination_risk"] = result.hallucination_risk
         state["unsupported_sentences"] = result.unsupported_sentences
         return state
 
+    def verification_agent(state: LoRState) -> LoRState:
+        prompt, finish = verification_plan(state)
+        return apply_verification(state, finish(None if prompt is None else verify_batch([prompt])[0]))
+
+    async def averification_agent(state: LoRState) -> LoRState:
+        prompt, finish = verification_plan(state)
+        return apply_verification(state, finish(None if prompt is None else (await averify_batch([prompt]))[0]))
+
+    # Speculative first drafts: candidate 0 is the regular, streamed draft and the
+    # others are sampled at higher temperatures, all requested at once
+    speculation = RunnableParallel({"0": draft_llm, **{
+        str(i): resilient_text("draft", llm.bind(
+            temperature=SPECULATIVE_TEMPERATURES[(i - 1) % len(SPECULATIVE_TEMPERATURES)]
+        ), name="speculative_draft")
+        for i in range(1, speculative_drafts)
+    }})
+
+    def candidate_plans(state: LoRState, messages) -> tuple:
+        """Candidate states, one per draft, and their verification plans"""
+        candidates = [set_draft(dict(state), message.content) for message in messages]
+        return candidates, [verification_plan(candidate) for candidate in candidates]
+
+    def choose_draft(state: LoRState, candidates: List[LoRState], plans: list, responses) -> LoRState:
+        """Keep the lowest-risk draft and record whether speculation saved a revise round"""
+        responses = iter(responses)
+        results = [finish(None if prompt is None else next(responses)) for prompt, finish in plans]
+        best = min(range(len(candidates)), key=lambda i: (
+            RISK_RANK.get(results[i].hallucination_risk, len(RISK_RANK)), len(results[i].unsupported_sentences), i
+        ))
+
+        trace = current_trace()
+        if trace is not None:
+            trace.count("speculative_rounds")
+            if results[0].hallucination_risk in REVISE_RISKS and MAX_REVISIONS > 0:
+                # The serial pipeline would have revised the first draft
+                trace.count("speculative_revisions_saved" if results[best].hallucination_risk not in REVISE_RISKS
+                            else "speculative_all_flagged")
+
+        state["draft_letter"] = candidates[best]["draft_letter"]
+        state["cited_draft"] = candidates[best]["cited_draft"]
+        return apply_verification(state, results[best])
+
+    def speculation_agent(state: LoRState) -> LoRState:
+        facts_text = state.get("facts_text") or format_facts(state["verified_facts"])
+        candidates, plans = candidate_plans(state, speculation.invoke(draft_prompt(state, facts_text)).values())
+        pending = [prompt for prompt, _ in plans if prompt is not None]
+        return choose_draft(state, candidates, plans, verify_batch(pending) if pending else [])
+
+    async def aspeculation_agent(state: LoRState) -> LoRState:
+        facts_text = state.get("facts_text") or format_facts(state["verified_facts"])
+        messages = (await speculation.ainvoke(draft_prompt(state, facts_text))).values()
+        candidates, plans = candidate_plans(state, messages)
+        pending = [prompt for prompt, _ in plans if prompt is not None]
+        return choose_draft(state, candidates, plans, await averify_batch(pending) if pending else [])
+
     def decision(state: LoRState) -> str:
-        if state["hallucination_risk"] in ["medium", "high"]:
+        if state["hallucination_risk"] in REVISE_RISKS and state.get("revision_count", 0) < MAX_REVISIONS:
             return "revise"
         return "final"
 
-    return fact_extraction_agent, drafting_agent, verification_agent, decision
+    nodes = {
+        "fact_extraction": (fact_extraction_agent, afact_extraction_agent),
+        "draft": (drafting_agent, adrafting_agent),
+        "verify": (verification_agent, averification_agent),
+        "decision": decision,
+    }
+    if speculative_drafts > 1:
+        nodes["speculate"] = (speculation_agent, aspeculation_agent)
+    return nodes
+
+def create_agents_with_api_key(api_key: str = None, language: str = "English", model: str = "gpt-4o",
+                               llm: BaseChatModel = None, node_llms: Dict[str, BaseChatModel] = None):
+    """Create agents with the provided API key and language.
+
+    An existing ``llm`` client may be passed in to share it between graphs;
+    otherwise one is created for the backend selected by LOR_LLM_BACKEND,
+    along with the smaller per-node clients configured in NODE_MODELS.
+    """
+    agents = create_agent_nodes(api_key, language, model, llm, node_llms=node_llms)
+    return agents["fact_extraction"][0], agents["draft"][0], agents["verify"][0], agents["decision"]
@@ -0,0 +1,308 @@
+"""Headless HTTP API for recommendation letter generation.
+
+Jobs are submitted to a bounded queue and run by a fixed pool of async
+workers on the server's event loop. Each OpenAI API key (sent as a bearer
+token) may only have a limited number of jobs in flight; when the queue or a
+key's allowance is full, submissions are rejected with 429 and Retry-After.
+Requests without a bearer key are rejected with 401 unless
+LOR_API_ALLOW_SERVER_KEY=1 lets them use the server's OPENAI_API_KEY.
+
+Endpoints:
+    POST /letters                 submit a job, returns 202 with its id
+    GET  /letters/{job_id}        poll status and result
+    GET  /letters/{job_id}/stream Server-Sent Events: letter tokens, then the result; a
+                                  "reset" event means discard the tokens received so far
+    GET  /metrics                 Prometheus text metrics
+    GET  /healthz                 liveness and queue depth
+
+Jobs are kept in process memory, so run one worker process per instance and
+scale out behind a load balancer that routes a job's polls to the instance
+that accepted it.
+
+Example:
+    uvicorn api:app --host 0.0.0.0 --port 8000
+    LOR_LLM_BACKEND=fake uvicorn api:app  # local fake LLM, no API calls
+"""
+import asyncio
+import json
+import os
+import time
+import uuid
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List, Optional
+
+from dotenv import load_dotenv
+from fastapi import FastAPI, Header, HTTPException
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, Field
+
+import prompts
+from graph import astream_generation
+from registry import get_fanout_graph, get_graph, key_fingerprint
+from telemetry import METRICS, RunTrace
+
+# Load environment variables
+load_dotenv()
+
+WORKERS = int(os.getenv("LOR_API_WORKERS", "4"))
+QUEUE_SIZE = int(os.getenv("LOR_API_QUEUE_SIZE", "64"))
+# Jobs one API key may have queued or running at once
+MAX_JOBS_PER_KEY = int(os.getenv("LOR_API_MAX_JOBS_PER_KEY", "4"))
+# Finished jobs are forgotten this many seconds after completion
+JOB_TTL = float(os.getenv("LOR_API_JOB_TTL", "3600"))
+# Seconds suggested to clients in Retry-After when rejecting a submission
+RETRY_AFTER = int(os.getenv("LOR_API_RETRY_AFTER", "5"))
+# Opt-in: serve requests without a bearer key on the server's OPENAI_API_KEY. Every such
+# client then spends that key and shares its job quota and job visibility
+ALLOW_SERVER_KEY = os.getenv("LOR_API_ALLOW_SERVER_KEY", "0") == "1"
+
+class LetterJobRequest(BaseModel):
+    candidate_name: str = Field(min_length=1)
+    recommender_role: str = "Professor"
+    target_programs: List[str] = Field(min_length=1, description="One letter is written per program")
+    raw_materials: str = Field(min_length=1)
+    language: str = "English"
+    model: str = "gpt-4o"
+
+class Job:
+    """A submitted generation and the events streamed from it"""
+
+    def __init__(self, request: LetterJobRequest, api_key: str):
+        self.id = uuid.uuid4().hex
+        self.request = request
+        self.api_key = api_key
+        self.key = key_fingerprint(api_key)
+        self.status = "queued"  # queued, running, done, error
+        self.result: Optional[Dict[str, Any]] = None
+        self.error: Optional[str] = None
+        self.timing: Optional[Dict[str, Any]] = None
+        self.created = time.time()
+        self.finished: Optional[float] = None
+        self.events: List[tuple] = []  # (event, data) in order, replayed to every stream client
+        self._changed = asyncio.Condition()
+
+    async def publish(self, event: str, data: Any) -> None:
+        async with self._changed:
+            self.events.append((event, data))
+            self._changed.notify_all()
+
+    async def wait_for_events(self, seen: int) -> None:
+        async with self._changed:
+            await self._changed.wait_for(lambda: len(self.events) > seen)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "result": self.result,
+            "error": self.error,
+            "timing": self.timing,
+            "created": self.created,
+            "finished": self.finished,
+        }
+
+class JobManager:
+    """Bounded job queue served by a fixed pool of worker tasks"""
+
+    def __init__(self, workers: int = WORKERS, queue_size: int = QUEUE_SIZE,
+                 max_jobs_per_key: int = MAX_JOBS_PER_KEY, job_ttl: float = JOB_TTL):
+        self.workers = workers
+        self.max_jobs_per_key = max_jobs_per_key
+        self.job_ttl = job_ttl
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.jobs: Dict[str, Job] = {}
+        self.in_flight: Dict[str, int] = {}
+        self.rejected = 0
+        self._tasks: List[asyncio.Task] = []
+
+    def start(self) -> None:
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def submit(self, request: LetterJobRequest, api_key: str) -> Job:
+        """Queue a job, or raise 429 when the key's allowance or the queue is full"""
+        self._evict_finished()
+        job = Job(request, api_key)
+        if self.in_flight.get(job.key, 0) >= self.max_jobs_per_key:
+            self._reject(f"Too many jobs in flight for this API key (limit {self.max_jobs_per_key})")
+        try:
+            self.queue.put_nowait(job)
+        except asyncio.QueueFull:
+            self._reject("Job queue is full")
+        self.in_flight[job.key] = self.in_flight.get(job.key, 0) + 1
+        self.jobs[job.id] = job
+        return job
+
+    def _reject(self, detail: str) -> None:
+        self.rejected += 1
+        raise HTTPException(status_code=429, detail=detail, headers={"Retry-After": str(RETRY_AFTER)})
+
+    def _evict_finished(self) -> None:
+        now = time.time()
+        expired = [job_id for job_id, job in self.jobs.items()
+                   if job.finished is not None and now - job.finished > self.job_ttl]
+        for job_id in expired:
+            del self.jobs[job_id]
+
+    async def _worker(self) -> None:
+        while True:
+            job = await self.queue.get()
+            try:
+                await self._run(job)
+            finally:
+                self.in_flight[job.key] -= 1
+                if not self.in_flight[job.key]:
+                    del self.in_flight[job.key]
+                self.queue.task_done()
+
+    async def _run(self, job: Job) -> None:
+        request = job.request
+        programs = list(dict.fromkeys(p.strip() for p in request.target_programs if p.strip()))
+        trace = RunTrace(run_id=job.id)
+        job.status = "running"
+        await job.publish("status", {"status": job.status})
+        try:
+            if len(programs) > 1:
+                graph = get_fanout_graph(job.api_key, request.language, request.model)
+                result = await graph.ainvoke({
+                    "candidate_name": request.candidate_name,
+                    "raw_materials": request.raw_materials,
+                    "verified_facts": [],
+                    "letter_requests": [
+                        {"target_program": program, "recommender_role": request.recommender_role}
+                        for program in programs
+                    ],
+                    "letters": []
+                }, trace.config())
+                letters = sorted(result["letters"], key=lambda l: programs.index(l["target_program"]))
+            else:
+                graph = get_graph(job.api_key, request.language, request.model)
+                initial_state = {
+                    "candidate_name": request.candidate_name,
+                    "recommender_role": request.recommender_role,
+                    "target_program": programs[0],
+                    "raw_materials": request.raw_materials,
+                    "verified_facts": [],
+                    "draft_letter": None,
+                    "cited_draft": None,
+                    "hallucination_risk": None,
+                    "unsupported_sentences": None,
+                    "revision_count": 0
+                }
+                result = {}
+                async for kind, payload in astream_generation(graph, initial_state, trace.config()):
+                    if kind == "token":
+                        await job.publish("token", {"text": payload})
+                    elif kind == "reset":
+                        # A redraft or retried attempt replaces the letter streamed so far
+                        await job.publish("reset", {})
+                    else:
+                        result = payload
+                letters = [result]
+
+            job.result = {
+                "letters": [
+                    {
+                        "target_program": letter["target_program"],
+                        "letter": letter.get("draft_letter", ""),
+                        "hallucination_risk": letter.get("hallucination_risk", "unknown"),
+                        "unsupported_sentences": letter.get("unsupported_sentences", []),
+                        "revisions": letter.get("revision_count", 0),
+                    }
+                    for letter in letters
+                ],
+                "verified_facts": [fact.model_dump() for fact in result.get("verified_facts", [])],
+            }
+            job.status = "done"
+        except Exception as e:
+            job.error = f"{type(e).__name__}: {e}"
+            job.status = "error"
+        finally:
+            job.timing = trace.finish()
+            job.finished = time.time()
+        await job.publish(job.status, job.to_dict())
+
+    def render_prometheus(self) -> str:
+        running = sum(1 for job in self.jobs.values() if job.status == "running")
+        return "\n".join([
+            "# TYPE lor_api_queue_depth gauge", f"lor_api_queue_depth {self.queue.qsize()}",
+            "# TYPE lor_api_jobs_running gauge", f"lor_api_jobs_running {running}",
+            "# TYPE lor_api_rejected_total counter", f"lor_api_rejected_total {self.rejected}",
+        ]) + "\n"
+
+def api_key_from(authorization: Optional[str]) -> str:
+    """OpenAI API key from an "Authorization: Bearer ..." header; the server's own
+    key is used instead only when LOR_API_ALLOW_SERVER_KEY=1"""
+    if authorization and authorization.lower().startswith("bearer ") and authorization[7:].strip():
+        return authorization[7:].strip()
+    api_key = os.getenv("OPENAI_API_KEY") if ALLOW_SERVER_KEY else None
+    if not api_key:
+        raise HTTPException(status_code=401, detail="Send an OpenAI API key as a bearer token")
+    return api_key
+
+def create_app(manager: Optional[JobManager] = None) -> FastAPI:
+    """Build the ASGI app; a custom ``manager`` sets the queue and worker limits"""
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        app.state.manager = manager or JobManager()
+        app.state.manager.start()
+        yield
+        await app.state.manager.stop()
+
+    app = FastAPI(title="Recommendation Letter Generator", lifespan=lifespan)
+
+    def find_job(job_id: str, authorization: Optional[str]) -> Job:
+        key = key_fingerprint(api_key_from(authorization))
+        job = app.state.manager.jobs.get(job_id)
+        # Jobs are only visible to the key that submitted them
+        if job is None or job.key != key:
+            raise HTTPException(status_code=404, detail="Job not found")
+        return job
+
+    @app.post("/letters", status_code=202)
+    async def submit(request: LetterJobRequest, authorization: Optional[str] = Header(None)):
+        if request.language not in prompts.LABELS:
+            raise HTTPException(status_code=422, detail=f"language must be one of {', '.join(prompts.LABELS)}")
+        if not any(program.strip() for program in request.target_programs):
+            raise HTTPException(status_code=422, detail="target_programs must name at least one program")
+        job = app.state.manager.submit(request, api_key_from(authorization))
+        return {"job_id": job.id, "status": job.status}
+
+    @app.get("/letters/{job_id}")
+    async def poll(job_id: str, authorization: Optional[str] = Header(None)):
+        return find_job(job_id, authorization).to_dict()
+
+    @app.get("/letters/{job_id}/stream")
+    async def stream(job_id: str, authorization: Optional[str] = Header(None)):
+        job = find_job(job_id, authorization)
+
+        async def events():
+            seen = 0
+            while True:
+                if seen == len(job.events):
+                    await job.wait_for_events(seen)
+                for event, data in job.events[seen:]:
+                    seen += 1
+                    yield f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+                    if event in ("done", "error"):
+                        return
+
+        return StreamingResponse(events(), media_type="text/event-stream",
+                                 headers={"Cache-Control": "no-cache"})
+
+    @app.get("/metrics", response_class=PlainTextResponse)
+    async def metrics():
+        return METRICS.render_prometheus() + app.state.manager.render_prometheus()
+
+    @app.get("/healthz")
+    async def healthz():
+        return {"status": "ok", "queue_depth": app.state.manager.queue.qsize()}
+
+    return app
+
+app = create_app()
@@ -0,0 +1,241 @@
+import asyncio
+import inspect
+import json
+import os
+import random
+import re
+import threading
+import time
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional
+
+import httpx
+import openai
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.runnables import RunnableLambda
+from langchain_openai import ChatOpenAI
+from pydantic import BaseModel, PrivateAttr, ValidationError
+
+# "openai" talks to the real API; "fake" uses the local FakeChatModel
+DEFAULT_BACKEND = os.getenv("LOR_LLM_BACKEND", "openai")
+
+DEFAULT_FAKE_LETTER = """January 1, 2025
+
+Dear Admissions Committee,
+
+I am writing to recommend the candidate, whom I have supervised closely.
+
+The candidate built a distributed scheduling system and presented the work at a regional workshop [F1, F2].
+
+I recommend the candidate without reservation.
+
+Sincerely,
+The Recommender"""
+
+DEFAULT_FAKE_OUTPUTS = {
+    "FactsList": {
+        "facts": [
+            {"claim": "The candidate built a distributed scheduling system",
+             "evidence": "Listed under research projects", "confidence": "high"},
+            {"claim": "The candidate presented the work at a regional workshop",
+             "evidence": "Listed under presentations", "confidence": "medium"},
+        ]
+    },
+    "VerificationResult": {"hallucination_risk": "low", "unsupported_sentences": []},
+}
+
+def estimate_tokens(text: str) -> int:
+    """Rough token estimate: words plus CJK characters, which are roughly a token each"""
+    return len(re.findall(r"[\u4e00-\u9fff]|[^\s\u4e00-\u9fff]+", text))
+
+class FakeChatModel(BaseChatModel):
+    """Deterministic local stand-in for ChatOpenAI.
+
+    Responses come from ``scripts``, keyed by "text" for plain calls and by
+    the schema name ("FactsList", "VerificationResult") for structured calls.
+    Each script is a list consumed in order, repeating its last item; items
+    may be strings, dicts, pydantic models or callables taking the prompt
+    (and, if they accept a second argument, the call's bound parameters such
+    as ``temperature``).
+    ``latency`` is applied once per call (time to first token) and
+    ``token_latency`` per streamed token. With ``simulate_prompt_cache`` a
+    repeated leading system message is reported as cached prompt tokens.
+
+    Faults can be injected per call: ``failure_rate`` raises a retryable
+    connection error, ``slow_rate`` adds ``slow_latency`` seconds, and
+    ``malformed_rate`` wraps structured responses in prose and a code fence
+    with a trailing comma, as models sometimes do.
+    """
+
+    model_name: str = "fake"
+    latency: float = 0.0
+    latency_jitter: float = 0.0
+    token_latency: float = 0.0
+    prompt_tokens: Optional[int] = None
+    completion_tokens: Optional[int] = None
+    scripts: Dict[str, List[Any]] = {}
+    seed: int = 0
+    simulate_prompt_cache: bool = False
+    failure_rate: float = 0.0
+    slow_rate: float = 0.0
+    slow_latency: float = 0.0
+    malformed_rate: float = 0.0
+
+    _seen_prefixes: set = PrivateAttr(default_factory=set)
+    _positions: Dict[str, int] = PrivateAttr(default_factory=dict)
+    _rng: random.Random = PrivateAttr()
+    _lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+
+    def model_post_init(self, __context: Any) -> None:
+        self._rng = random.Random(self.seed)
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat"
+
+    @property
+    def _identifying_params(self) -> Dict[str, Any]:
+        return {"model_name": self.model_name}
+
+    def _next_output(self, key: str, prompt: str, params: Dict[str, Any]) -> Any:
+        with self._lock:
+            script = self.scripts.get(key)
+            if not script:
+                output = DEFAULT_FAKE_OUTPUTS.get(key, DEFAULT_FAKE_LETTER)
+            else:
+                position = self._positions.get(key, 0)
+                output = script[min(position, len(script) - 1)]
+                self._positions[key] = position + 1
+        if not callable(output):
+            return output
+        return output(prompt, params) if len(inspect.signature(output).parameters) > 1 else output(prompt)
+
+    def _chance(self, rate: float) -> bool:
+        if rate <= 0:
+            return False
+        with self._lock:
+            return self._rng.random() < rate
+
+    def _respond(self, messages: List[BaseMessage], kwargs: Dict[str, Any]) -> str:
+        if self._chance(self.failure_rate):
+            raise openai.APIConnectionError(
+                message="Injected fake failure", request=httpx.Request("POST", "http://fake.invalid/v1/chat/completions")
+            )
+        prompt = "\n".join(str(m.content) for m in messages)
+        schema_name = kwargs.get("structured_schema")
+        params = {k: v for k, v in kwargs.items() if k != "structured_schema"}
+        output = self._next_output(schema_name or "text", prompt, params)
+        if isinstance(output, BaseModel):
+            text = output.model_dump_json()
+        elif isinstance(output, dict):
+            text = json.dumps(output, ensure_ascii=False)
+        else:
+            return str(output)
+        if schema_name and self._chance(self.malformed_rate):
+            return f"Here is the result:\n```json\n{text[:-1]},}}\n```"
+        return text
+
+    def _usage(self, messages: List[BaseMessage], text: str) -> Dict[str, Any]:
+        prompt = "\n".join(str(m.content) for m in messages)
+        input_tokens = self.prompt_tokens if self.prompt_tokens is not None else estimate_tokens(prompt)
+        output_tokens = self.completion_tokens if self.completion_tokens is not None else estimate_tokens(text)
+        usage = {"input_tokens": input_tokens, "output_tokens": output_tokens,
+                 "total_tokens": input_tokens + output_tokens}
+        if self.simulate_prompt_cache and len(messages) > 1:
+            prefix = str(messages[0].content)
+            with self._lock:
+                cached = prefix in self._seen_prefixes
+                self._seen_prefixes.add(prefix)
+            usage["input_token_details"] = {"cache_read": min(estimate_tokens(prefix), input_tokens) if cached else 0}
+        return usage
+
+    def _call_delay(self) -> float:
+        with self._lock:
+            delay = max(0.0, self.latency + self._rng.uniform(-self.latency_jitter, self.latency_jitter))
+        return delay + (self.slow_latency if self._chance(self.slow_rate) else 0.0)
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        time.sleep(self._call_delay())
+        text = self._respond(messages, kwargs)
+        time.sleep(self.token_latency * estimate_tokens(text))
+        message = AIMessage(content=text, usage_metadata=self._usage(messages, text),
+                            response_metadata={"model_name": self.model_name})
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        await asyncio.sleep(self._call_delay())
+        text = self._respond(messages, kwargs)
+        await asyncio.sleep(self.token_latency * estimate_tokens(text))
+        message = AIMessage(content=text, usage_metadata=self._usage(messages, text),
+                            response_metadata={"model_name": self.model_name})
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _chunks(self, messages, text: str) -> List[ChatGenerationChunk]:
+        pieces = re.findall(r"\s*\S+", text) or [text]
+        chunks = [ChatGenerationChunk(message=AIMessageChunk(content=piece)) for piece in pieces]
+        chunks.append(ChatGenerationChunk(message=AIMessageChunk(
+            content="", usage_metadata=self._usage(messages, text),
+            response_metadata={"model_name": self.model_name}
+        )))
+        return chunks
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs) -> Iterator[ChatGenerationChunk]:
+        time.sleep(self._call_delay())
+        for chunk in self._chunks(messages, self._respond(messages, kwargs)):
+            if chunk.message.content:
+                time.sleep(self.token_latency)
+            if run_manager:
+                run_manager.on_llm_new_token(chunk.message.content, chunk=chunk)
+            yield chunk
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs) -> AsyncIterator[ChatGenerationChunk]:
+        await asyncio.sleep(self._call_delay())
+        for chunk in self._chunks(messages, self._respond(messages, kwargs)):
+            if chunk.message.content:
+                await asyncio.sleep(self.token_latency)
+            if run_manager:
+                await run_manager.on_llm_new_token(chunk.message.content, chunk=chunk)
+            yield chunk
+
+    def with_structured_output(self, schema, *, include_raw: bool = False, **kwargs):
+        """Return scripted instances of ``schema``; mirrors ChatOpenAI's include_raw output"""
+
+        def parse(message: AIMessage):
+            if not include_raw:
+                return schema.model_validate_json(message.content)
+            try:
+                return {"raw": message, "parsed": schema.model_validate_json(message.content),
+                        "parsing_error": None}
+            except ValidationError as e:
+                return {"raw": message, "parsed": None, "parsing_error": e}
+
+        return self.bind(structured_schema=schema.__name__) | RunnableLambda(parse)
+
+def create_llm(api_key: str = None, model: str = "gpt-4o", backend: str = None,
+               http_client=None, temperature: float = 0.3, timeout: Optional[float] = None) -> BaseChatModel:
+    """Create the chat model for the configured backend; ``timeout`` bounds each request in seconds"""
+    backend = backend or DEFAULT_BACKEND
+    if backend == "fake":
+        return FakeChatModel(
+            model_name=model,
+            latency=float(os.getenv("LOR_FAKE_LATENCY", "0")),
+            token_latency=float(os.getenv("LOR_FAKE_TOKEN_LATENCY", "0")),
+            failure_rate=float(os.getenv("LOR_FAKE_FAILURE_RATE", "0")),
+            slow_rate=float(os.getenv("LOR_FAKE_SLOW_RATE", "0")),
+            slow_latency=float(os.getenv("LOR_FAKE_SLOW_LATENCY", "0")),
+            malformed_rate=float(os.getenv("LOR_FAKE_MALFORMED_RATE", "0"))
+        )
+    if backend == "openai":
+        return ChatOpenAI(
+            model=model,
+            temperature=temperature,
+            api_key=api_key or os.getenv("OPENAI_API_KEY"),
+            http_client=http_client,
+            timeout=timeout,
+            # Retries, deadlines and hedging are handled per node by resilience.py
+            max_retries=0,
+            # Report usage (including cached prompt tokens) on streamed responses too
+            stream_usage=True
+        )
+    raise ValueError(f"Unknown LLM backend: {backend}")
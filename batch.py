@@ -0,0 +1,154 @@
+"""Headless batch generation of recommendation letters.
+
+Reads candidates from a JSONL or CSV file and runs the LoR workflow for each
+one concurrently. Every finished item is appended to the results JSONL as
+soon as it completes, so an interrupted run can be resumed by re-running the
+same command: items already recorded as "ok" are skipped.
+
+Example:
+    python batch.py candidates.jsonl -o results.jsonl --concurrency 8
+"""
+import argparse
+import asyncio
+import csv
+import hashlib
+import json
+import os
+import sys
+import time
+from typing import Dict, Iterable, List, Set
+
+from dotenv import load_dotenv
+
+from graph import LoRState
+from registry import get_graph
+from telemetry import RunTrace
+
+# Load environment variables
+load_dotenv()
+
+REQUIRED_FIELDS = ("candidate_name", "target_program", "raw_materials")
+
+def read_candidates(path: str) -> List[Dict[str, str]]:
+    """Load candidate rows from a .jsonl or .csv file"""
+    with open(path, encoding="utf-8", newline="") as f:
+        if path.lower().endswith(".csv"):
+            rows = list(csv.DictReader(f))
+        else:
+            rows = [json.loads(line) for line in f if line.strip()]
+
+    for line_no, row in enumerate(rows, 1):
+        missing = [field for field in REQUIRED_FIELDS if not row.get(field)]
+        if missing:
+            raise ValueError(f"Row {line_no} of {path} is missing: {', '.join(missing)}")
+        # Rows without an explicit id are identified by their content
+        if not row.get("id"):
+            row["id"] = hashlib.sha256(
+                json.dumps(row, sort_keys=True, ensure_ascii=False).encode("utf-8")
+            ).hexdigest()[:16]
+    return rows
+
+def completed_ids(path: str) -> Set[str]:
+    """Ids already written successfully to the results file"""
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # partially written line from an interrupted run
+            if record.get("status") == "ok":
+                done.add(record["id"])
+    return done
+
+def initial_state(row: Dict[str, str], default_role: str) -> LoRState:
+    return {
+        "candidate_name": row["candidate_name"],
+        "recommender_role": row.get("recommender_role") or default_role,
+        "target_program": row["target_program"],
+        "raw_materials": row["raw_materials"],
+        "verified_facts": [],
+        "draft_letter": None,
+        "cited_draft": None,
+        "hallucination_risk": None,
+        "unsupported_sentences": None,
+        "revision_count": 0
+    }
+
+async def run_item(graph, row: Dict[str, str], args: argparse.Namespace) -> Dict:
+    # Single pass: every LLM call inside the graph is already retried by resilience.py,
+    # and failed items are picked up again by re-running the same command
+    started = time.monotonic()
+    try:
+        trace = RunTrace()
+        result = await graph.ainvoke(initial_state(row, args.role), trace.config())
+        timing = trace.finish()
+    except Exception as error:
+        return {
+            "id": row["id"],
+            "status": "error",
+            "error": f"{type(error).__name__}: {error}",
+            "elapsed": round(time.monotonic() - started, 3)
+        }
+    return {
+        "id": row["id"],
+        "status": "ok",
+        "candidate_name": row["candidate_name"],
+        "target_program": row["target_program"],
+        "draft_letter": result.get("draft_letter"),
+        "hallucination_risk": result.get("hallucination_risk"),
+        "unsupported_sentences": result.get("unsupported_sentences") or [],
+        "revision_count": result.get("revision_count", 0),
+        "verified_facts": [fact.model_dump() for fact in result.get("verified_facts", [])],
+        "elapsed": round(time.monotonic() - started, 3),
+        "timing": timing
+    }
+
+async def run_batch(rows: Iterable[Dict[str, str]], args: argparse.Namespace) -> Dict[str, int]:
+    graph = get_graph(args.api_key, args.language, args.model)
+    semaphore = asyncio.Semaphore(args.concurrency)
+    counts = {"ok": 0, "error": 0}
+
+    async def bounded(row):
+        async with semaphore:
+            return await run_item(graph, row, args)
+
+    with open(args.output, "a", encoding="utf-8") as out:
+        for task in asyncio.as_completed([bounded(row) for row in rows]):
+            record = await task
+            out.write(json.dumps(record, ensure_ascii=False) + "\n")
+            out.flush()
+            counts[record["status"]] += 1
+            print(f"[{record['status']}] {record['id']} ({record['elapsed']}s)", file=sys.stderr)
+    return counts
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Generate recommendation letters for a batch of candidates")
+    parser.add_argument("input", help="Candidates file (.jsonl or .csv)")
+    parser.add_argument("-o", "--output", default="results.jsonl", help="Results JSONL, appended to and used for resume")
+    parser.add_argument("--concurrency", type=int, default=4, help="Maximum workflows running at once")
+    parser.add_argument("--language", default="English", choices=("English", "繁體中文"))
+    parser.add_argument("--role", default="Professor", help="Recommender role for rows that do not set one")
+    parser.add_argument("--model", default="gpt-4o")
+    parser.add_argument("--api-key", default=os.getenv("OPENAI_API_KEY"))
+    return parser.parse_args(argv)
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    rows = read_candidates(args.input)
+    done = completed_ids(args.output)
+    pending = [row for row in rows if row["id"] not in done]
+    print(f"{len(rows)} candidates, {len(done)} already completed, {len(pending)} to run", file=sys.stderr)
+
+    started = time.monotonic()
+    counts = asyncio.run(run_batch(pending, args))
+    elapsed = time.monotonic() - started
+    throughput = len(pending) / elapsed if elapsed > 0 else 0.0
+    print(f"Done: {counts['ok']} ok, {counts['error']} failed in {elapsed:.1f}s "
+          f"({throughput:.2f} letters/s)", file=sys.stderr)
+    return 1 if counts["error"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,296 @@
+"""Offline latency benchmark for the LoR workflow.
+
+Runs the compiled graph against the local FakeChatModel so results are
+reproducible and cost nothing. Reports per-node p50/p95 latency, revision
+rounds, tokens per letter and throughput for each batch size. With
+--pdf-dir it instead reports how many tokens PDF layout cleanup saves on a
+directory of sample CVs.
+
+Example:
+    python benchmark.py --batch-sizes 1 4 16 --latency 0.2 --token-latency 0.005 --revise-rate 0.3
+    python benchmark.py --batch-sizes 16 --revise-rate 0.3 --speculative-drafts 3
+    python benchmark.py --batch-sizes 16 --small-model-latency 0.08
+    python benchmark.py --batch-sizes 64 --slow-rate 0.05 --slow-latency 3 --failure-rate 0.05 --malformed-rate 0.1
+    python benchmark.py --pdf-dir samples/cvs
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import sys
+import time
+import uuid
+from collections import defaultdict
+from typing import Dict, List
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+import prompts
+from agents import SPECULATIVE_TEMPERATURES
+from backends import DEFAULT_FAKE_LETTER, DEFAULT_FAKE_OUTPUTS, FakeChatModel, estimate_tokens
+from graph import build_graph
+from pdf_extract import extract_pdf_text
+from telemetry import RunTrace
+
+SAMPLE_MATERIALS = """=== Content from PDF ===
+Research assistant, Distributed Systems Lab (2021-2024)
+Built a distributed scheduling system used by three research groups.
+Presented the scheduler at a regional systems workshop.
+"""
+
+class TokenCounter(BaseCallbackHandler):
+    """Sums token usage reported by every LLM call in a run"""
+
+    def __init__(self):
+        self.input_tokens = 0
+        self.output_tokens = 0
+
+    def on_llm_end(self, response, **kwargs) -> None:
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+                self.input_tokens += usage.get("input_tokens", 0)
+                self.output_tokens += usage.get("output_tokens", 0)
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered) + 0.5) - 1))
+    return ordered[index]
+
+# Opening sentences of the fake letter; sampled drafts (a bound temperature) pick one by
+# their temperature's position in LOR_SPECULATIVE_TEMPERATURES, so speculative candidates differ and are judged independently
+OPENINGS = [
+    "I am writing to recommend the candidate, whom I have supervised closely.",
+    "It is my pleasure to recommend the candidate, whose work I have followed for two years.",
+    "I recommend the candidate, who worked in my group as a research assistant.",
+    "I am delighted to support the candidate, whom I have mentored in research.",
+]
+
+def make_llm(args: argparse.Namespace, model_name: str = "gpt-4o", latency: float = None) -> FakeChatModel:
+    def verdict(prompt: str) -> Dict:
+        # Flag the letter's opening sentence at the configured rate. The draw depends only
+        # on the prompt, so escalated verifications get the same verdict
+        opening = next((sentence for sentence in OPENINGS if sentence in prompt), None)
+        if opening is not None and random.Random(f"{args.seed}:{prompt}").random() < args.revise_rate:
+            return {"hallucination_risk": "medium", "unsupported_sentences": [opening]}
+        return {"hallucination_risk": "low", "unsupported_sentences": []}
+
+    def text(prompt: str, params: Dict) -> str:
+        # Repairs drop the flagged sentences, so revised letters differ from the draft
+        labels = prompts.LABELS[args.language]
+        if labels["unsupported"] not in prompt:
+            temperature = params.get("temperature")
+            if temperature is None:
+                return DEFAULT_FAKE_LETTER
+            rank = SPECULATIVE_TEMPERATURES.index(temperature) if temperature in SPECULATIVE_TEMPERATURES else 0
+            opening = OPENINGS[1 + rank % (len(OPENINGS) - 1)]
+            return DEFAULT_FAKE_LETTER.replace(OPENINGS[0], opening)
+        paragraph, flagged = prompt.split(labels["paragraph"] + "\n", 1)[1].split(labels["unsupported"] + "\n", 1)
+        for line in flagged.splitlines():
+            paragraph = paragraph.replace(line[2:], "")
+        return paragraph.strip() or "I am glad to support this application."
+
+    def facts(prompt: str) -> Dict:
+        # Tag the facts with the item's id so verification caches are only reused within a letter
+        item = re.search(r"Benchmark id: (\S+)", prompt)
+        return {"facts": [
+            dict(fact, evidence=f"{fact['evidence']} ({item.group(1) if item else ''})")
+            for fact in DEFAULT_FAKE_OUTPUTS["FactsList"]["facts"]
+        ]}
+
+    return FakeChatModel(
+        model_name=model_name,
+        latency=args.latency if latency is None else latency,
+        latency_jitter=args.jitter,
+        token_latency=args.token_latency,
+        scripts={"text": [text], "FactsList": [facts], "VerificationResult": [verdict]},
+        seed=args.seed,
+        failure_rate=args.failure_rate,
+        slow_rate=args.slow_rate,
+        slow_latency=args.slow_latency,
+        malformed_rate=args.malformed_rate
+    )
+
+def initial_state(index: int) -> Dict:
+    return {
+        "candidate_name": f"Candidate {index}",
+        "recommender_role": "Professor",
+        "target_program": "PhD in Computer Science",
+        # Unique materials per item so fact extraction is never served from cache
+        "raw_materials": f"{SAMPLE_MATERIALS}\nBenchmark id: {uuid.uuid4()}",
+        "verified_facts": [],
+        "draft_letter": None,
+        "cited_draft": None,
+        "hallucination_risk": None,
+        "unsupported_sentences": None,
+        "revision_count": 0
+    }
+
+async def run_one(graph, index: int) -> Dict:
+    counter = TokenCounter()
+    trace = RunTrace()
+    node_latency = defaultdict(list)
+    started = last = time.perf_counter()
+    state = None
+    async for mode, payload in graph.astream(initial_state(index), trace.config({"callbacks": [counter]}),
+                                             stream_mode=["updates", "values"]):
+        if mode == "updates":
+            now = time.perf_counter()
+            for node in payload:
+                node_latency[node].append(now - last)
+            last = now
+        else:
+            state = payload
+    return {
+        "elapsed": time.perf_counter() - started,
+        "node_latency": node_latency,
+        "revisions": state.get("revision_count", 0),
+        "tokens": counter.input_tokens + counter.output_tokens,
+        "cost": trace.summary()["cost"],
+        "events": trace.events
+    }
+
+async def run_batch(batch_size: int, args: argparse.Namespace) -> Dict:
+    node_llms = None
+    if args.small_model_latency is not None:
+        small = make_llm(args, "gpt-4o-mini", args.small_model_latency)
+        node_llms = {"fact_extraction": small, "verify": small}
+    graph = build_graph(language=args.language, llm=make_llm(args), speculative_drafts=args.speculative_drafts,
+                        node_llms=node_llms)
+    started = time.perf_counter()
+    runs = await asyncio.gather(*(run_one(graph, i) for i in range(batch_size)))
+    wall = time.perf_counter() - started
+
+    per_node = defaultdict(list)
+    for run in runs:
+        for node, values in run["node_latency"].items():
+            per_node[node].extend(values)
+    letter_latency = [run["elapsed"] for run in runs]
+    events = defaultdict(int)
+    for run in runs:
+        for event, count in run["events"].items():
+            events[event] += count
+    return {
+        "batch_size": batch_size,
+        "wall_time": wall,
+        "throughput": batch_size / wall if wall > 0 else 0.0,
+        "letter_p50": percentile(letter_latency, 50),
+        "letter_p95": percentile(letter_latency, 95),
+        "nodes": {node: {"p50": percentile(v, 50), "p95": percentile(v, 95), "calls": len(v)}
+                  for node, v in per_node.items()},
+        "revisions_per_letter": sum(run["revisions"] for run in runs) / batch_size,
+        "tokens_per_letter": sum(run["tokens"] for run in runs) / batch_size,
+        "cost_per_letter": sum(run["cost"] for run in runs) / batch_size,
+        # Small-model calls, and those retried on the large model, by reason
+        "small_model_calls": sum(v for e, v in events.items() if e.endswith("_small_model_calls")),
+        "escalations": {e: v for e, v in events.items() if "_escalated_" in e},
+        # Letters whose first draft would have been revised, but another speculative draft passed
+        "speculative_revisions_saved": events["speculative_revisions_saved"],
+        "speculative_all_flagged": events["speculative_all_flagged"],
+        "verification_sentences_checked": events["verification_sentences_checked"],
+        "verification_sentences_reused": events["verification_sentences_reused"],
+        "events": dict(events)
+    }
+
+def print_report(report: Dict) -> None:
+    print(f"\nBatch size {report['batch_size']}: {report['throughput']:.2f} letters/s, "
+          f"letter p50 {report['letter_p50'] * 1000:.0f} ms / p95 {report['letter_p95'] * 1000:.0f} ms, "
+          f"{report['revisions_per_letter']:.2f} revisions and {report['tokens_per_letter']:.0f} tokens per letter")
+    if report["small_model_calls"]:
+        escalated = sum(report["escalations"].values())
+        reasons = ", ".join(f"{event} {n}" for event, n in sorted(report["escalations"].items()))
+        print(f"  ${report['cost_per_letter']:.4f} per letter; {escalated} of {report['small_model_calls']} "
+              f"small-model calls escalated" + (f" ({reasons})" if reasons else ""))
+    faults = {e: n for e, n in report["events"].items()
+              if e.endswith(("_retries", "_timeouts", "_hedges", "_hedge_wins", "_repairs"))}
+    if faults:
+        print("  resilience: " + ", ".join(f"{event} {n}" for event, n in sorted(faults.items())))
+    reused, checked = report["verification_sentences_reused"], report["verification_sentences_checked"]
+    if reused + checked:
+        print(f"  verification reused {reused} of {reused + checked} sentence verdicts")
+    flagged = report["speculative_revisions_saved"] + report["speculative_all_flagged"]
+    if flagged:
+        print(f"  speculation saved a revise round for {report['speculative_revisions_saved']} of "
+              f"{flagged} letters whose first draft was flagged")
+    print(f"  {'node':<18}{'calls':>7}{'p50 ms':>10}{'p95 ms':>10}")
+    for node, stats in report["nodes"].items():
+        print(f"  {node:<18}{stats['calls']:>7}{stats['p50'] * 1000:>10.1f}{stats['p95'] * 1000:>10.1f}")
+
+def pdf_report(directory: str) -> List[Dict]:
+    """Estimated tokens of each PDF's raw and layout-cleaned text"""
+    rows = []
+    for name in sorted(os.listdir(directory)):
+        if not name.lower().endswith(".pdf"):
+            continue
+        with open(os.path.join(directory, name), "rb") as f:
+            data = f.read()
+        started = time.perf_counter()
+        cleaned = extract_pdf_text(data, clean=True)
+        elapsed = time.perf_counter() - started
+        raw = extract_pdf_text(data, clean=False)
+        rows.append({
+            "file": name,
+            "pages": cleaned.pages_read,
+            "raw_tokens": estimate_tokens(raw.text),
+            "clean_tokens": estimate_tokens(cleaned.text),
+            "clean_seconds": elapsed,
+            "sections": cleaned.sections,
+        })
+    return rows
+
+def print_pdf_report(rows: List[Dict]) -> None:
+    print(f"  {'file':<32}{'pages':>6}{'raw tok':>9}{'clean tok':>11}{'saved':>8}  sections")
+    for row in rows:
+        saved = 1 - row["clean_tokens"] / row["raw_tokens"] if row["raw_tokens"] else 0.0
+        print(f"  {row['file'][:31]:<32}{row['pages']:>6}{row['raw_tokens']:>9}{row['clean_tokens']:>11}"
+              f"{saved:>8.1%}  {', '.join(row['sections'])}")
+    raw_total = sum(row["raw_tokens"] for row in rows)
+    clean_total = sum(row["clean_tokens"] for row in rows)
+    if raw_total:
+        print(f"\n{len(rows)} PDFs: {raw_total} -> {clean_total} tokens ({1 - clean_total / raw_total:.1%} fewer)")
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark the LoR workflow against a local fake LLM")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--latency", type=float, default=0.2, help="Seconds per LLM call before the first token")
+    parser.add_argument("--jitter", type=float, default=0.05, help="Uniform +/- jitter on --latency")
+    parser.add_argument("--token-latency", type=float, default=0.002, help="Seconds per generated token")
+    parser.add_argument("--revise-rate", type=float, default=0.3, help="Probability a verification asks for revision")
+    parser.add_argument("--speculative-drafts", type=int, default=1,
+                        help="First drafts written concurrently per letter; the lowest-risk one is kept")
+    parser.add_argument("--small-model-latency", type=float,
+                        help="Run extraction and verification on a smaller fake model with this per-call latency")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Share of LLM calls that fail (retried)")
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="Share of LLM calls delayed by --slow-latency")
+    parser.add_argument("--slow-latency", type=float, default=0.0, help="Extra seconds for slow LLM calls")
+    parser.add_argument("--malformed-rate", type=float, default=0.0,
+                        help="Share of structured responses returned as malformed JSON (repaired locally)")
+    parser.add_argument("--language", default="English", choices=("English", "繁體中文"))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--pdf-dir", help="Report layout-cleanup token savings on the PDFs in this directory")
+    parser.add_argument("--json", action="store_true", help="Print the reports as JSON")
+    return parser.parse_args(argv)
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    if args.pdf_dir:
+        rows = pdf_report(args.pdf_dir)
+        if args.json:
+            print(json.dumps(rows, indent=2, ensure_ascii=False))
+        else:
+            print_pdf_report(rows)
+        return 0
+    reports = [asyncio.run(run_batch(size, args)) for size in args.batch_sizes]
+    if args.json:
+        print(json.dumps(reports, indent=2))
+    else:
+        for report in reports:
+            print_report(report)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
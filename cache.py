@@ -0,0 +1,133 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from typing import Dict, List, Optional
+
+# Cache location and size can be overridden through the environment
+DEFAULT_CACHE_PATH = os.getenv("LOR_CACHE_PATH", ".lor_cache.sqlite")
+DEFAULT_MAX_ENTRIES = int(os.getenv("LOR_CACHE_MAX_ENTRIES", "512"))
+
+def normalize_text(text: str) -> str:
+    """Normalize text so cosmetic differences do not change the cache key"""
+    text = unicodedata.normalize("NFKC", text or "")
+    lines = [re.sub(r"\s+", " ", line).strip() for line in text.splitlines()]
+    return "\n".join(line for line in lines if line)
+
+def content_key(*parts: str) -> str:
+    """Return a stable hash for the given key parts"""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update((part or "").encode("utf-8"))
+        digest.update(b"\x1f")
+    return digest.hexdigest()
+
+def fact_cache_key(raw_materials: str, language: str, model: str) -> str:
+    """Key for fact extraction results: normalized materials, language and model.
+
+    ``model`` names the backend as well as the model, e.g. "openai-chat:gpt-4o",
+    so results from the fake backend are never served to real runs.
+    """
+    return content_key("facts", normalize_text(raw_materials), language, model)
+
+def verification_cache_key(letter: str, facts_digest: str, language: str, model: str) -> str:
+    """Key for a letter's verification verdict: normalized letter, fact set, language and model"""
+    return content_key("verification", normalize_text(letter), facts_digest, language, model)
+
+def sentence_cache_key(sentence: str, fact_ids: List[str], facts_digest: str, language: str, model: str) -> str:
+    """Key for one sentence's verdict, including the fact IDs it cites"""
+    return content_key("sentence", normalize_text(sentence), ",".join(fact_ids), facts_digest, language, model)
+
+class DiskCache:
+    """SQLite-backed key/value cache with LRU eviction and hit/miss counters.
+
+    One database file can hold several namespaces; each namespace is bounded
+    to ``max_entries`` rows independently. Safe to share between threads.
+    """
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, namespace: str = "default",
+                 max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.path = path
+        self.namespace = namespace
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS cache_entries (
+                    namespace TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    value TEXT NOT NULL,
+                    last_access REAL NOT NULL,
+                    PRIMARY KEY (namespace, key)
+                )
+                """
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS cache_entries_lru "
+                "ON cache_entries (namespace, last_access)"
+            )
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT value FROM cache_entries WHERE namespace = ? AND key = ?",
+                (self.namespace, key)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute(
+                "UPDATE cache_entries SET last_access = ? WHERE namespace = ? AND key = ?",
+                (time.time(), self.namespace, key)
+            )
+            self.hits += 1
+            return row[0]
+
+    def set(self, key: str, value: str) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache_entries (namespace, key, value, last_access) "
+                "VALUES (?, ?, ?, ?)",
+                (self.namespace, key, value, time.time())
+            )
+            # Evict least recently used entries beyond the size bound
+            self._conn.execute(
+                """
+                DELETE FROM cache_entries
+                WHERE namespace = ? AND key NOT IN (
+                    SELECT key FROM cache_entries WHERE namespace = ?
+                    ORDER BY last_access DESC LIMIT ?
+                )
+                """,
+                (self.namespace, self.namespace, self.max_entries)
+            )
+
+    def clear(self) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM cache_entries WHERE namespace = ?", (self.namespace,))
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM cache_entries WHERE namespace = ?", (self.namespace,)
+            ).fetchone()[0]
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self)}
+
+_caches: Dict[str, DiskCache] = {}
+_caches_lock = threading.Lock()
+
+def get_cache(namespace: str) -> DiskCache:
+    """Return the process-wide cache for a namespace"""
+    with _caches_lock:
+        if namespace not in _caches:
+            _caches[namespace] = DiskCache(namespace=namespace)
+        return _caches[namespace]
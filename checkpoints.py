@@ -0,0 +1,114 @@
+import os
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+from langgraph.checkpoint.base import BaseCheckpointSaver
+from langgraph.checkpoint.memory import InMemorySaver
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+
+from event_loop import run
+
+# "sqlite" persists graph state across reruns and restarts, "memory" only within
+# the process, and "none" disables checkpointing
+DEFAULT_BACKEND = os.getenv("LOR_CHECKPOINT_BACKEND", "sqlite")
+CHECKPOINT_PATH = os.getenv("LOR_CHECKPOINT_PATH", ".lor_checkpoints.sqlite")
+# Runs not touched for this many days are deleted when the SQLite saver is opened (0 keeps all)
+RETENTION_DAYS = float(os.getenv("LOR_CHECKPOINT_RETENTION_DAYS", "30"))
+
+# State types that may be restored from a checkpoint
+ALLOWED_STATE_TYPES = [("graph", "VerifiedFact")]
+
+_checkpointer: Optional[BaseCheckpointSaver] = None
+_checkpointer_lock = threading.Lock()
+
+def _serializer() -> JsonPlusSerializer:
+    return JsonPlusSerializer(allowed_msgpack_modules=ALLOWED_STATE_TYPES)
+
+async def _prune_sqlite(saver, max_age_days: float) -> int:
+    """Delete the threads whose newest checkpoint is older than ``max_age_days``.
+
+    Ages come from the ``run_at`` metadata written by ``thread_config``; the query
+    only reads the metadata column, so no checkpoint is deserialized.
+    """
+    cutoff = time.time() - max_age_days * 86400
+    async with saver.conn.execute(
+        "SELECT thread_id FROM checkpoints GROUP BY thread_id "
+        "HAVING MAX(json_extract(CAST(metadata AS TEXT), '$.run_at')) < ?",
+        (cutoff,)
+    ) as cursor:
+        threads = [row[0] for row in await cursor.fetchall()]
+    for thread_id in threads:
+        await saver.adelete_thread(thread_id)
+    return len(threads)
+
+async def _open_sqlite(path: str) -> BaseCheckpointSaver:
+    # Imported lazily so the sqlite extra is only needed when it is used
+    import aiosqlite
+    from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+
+    saver = AsyncSqliteSaver(await aiosqlite.connect(path), serde=_serializer())
+    await saver.setup()
+    if RETENTION_DAYS > 0:
+        await _prune_sqlite(saver, RETENTION_DAYS)
+    return saver
+
+def create_checkpointer(backend: str = DEFAULT_BACKEND, path: str = CHECKPOINT_PATH) -> Optional[BaseCheckpointSaver]:
+    """Create a checkpointer for ``build_graph``.
+
+    The SQLite saver is async and bound to the shared event loop, so graphs
+    using it must be driven from there (``ainvoke``/``astream`` through
+    ``event_loop.run``); its sync methods hop onto that loop themselves.
+    """
+    if backend == "sqlite":
+        return run(_open_sqlite(path))
+    if backend == "memory":
+        return InMemorySaver(serde=_serializer())
+    if backend == "none":
+        return None
+    raise ValueError(f"Unknown checkpoint backend: {backend}")
+
+def get_checkpointer() -> Optional[BaseCheckpointSaver]:
+    """Return the process-wide checkpointer, creating it on first use"""
+    global _checkpointer
+    with _checkpointer_lock:
+        if _checkpointer is None and DEFAULT_BACKEND != "none":
+            _checkpointer = create_checkpointer()
+        return _checkpointer
+
+def new_thread_id(session_id: str) -> str:
+    """One checkpoint thread per generation, prefixed by the session that started it"""
+    return f"{session_id}:{uuid.uuid4().hex[:12]}"
+
+def thread_config(thread_id: str, config: Optional[dict] = None, **metadata: Any) -> dict:
+    """Add the checkpoint thread and searchable run metadata to a graph config.
+
+    ``run_at`` stamps every checkpoint with the time it was written, which the
+    retention prune uses to find abandoned runs.
+    """
+    config = dict(config or {})
+    config["configurable"] = {**(config.get("configurable") or {}), "thread_id": thread_id}
+    config["metadata"] = {**(config.get("metadata") or {}), "run_at": time.time(), **metadata}
+    return config
+
+async def alist_runs(checkpointer: BaseCheckpointSaver, session_id: str, limit: int = 20) -> List[Dict[str, Any]]:
+    """Latest checkpoint of each of a session's runs, newest first"""
+    runs: Dict[str, Dict[str, Any]] = {}
+    async for checkpoint in checkpointer.alist(None, filter={"lor_session": session_id}):
+        thread_id = checkpoint.config["configurable"]["thread_id"]
+        if checkpoint.config["configurable"].get("checkpoint_ns") or thread_id in runs:
+            continue
+        runs[thread_id] = {"thread_id": thread_id, **checkpoint.metadata}
+        if len(runs) >= limit:
+            break
+    return list(runs.values())
+
+def list_runs(checkpointer: Optional[BaseCheckpointSaver], session_id: str, limit: int = 20) -> List[Dict[str, Any]]:
+    if checkpointer is None:
+        return []
+    return run(alist_runs(checkpointer, session_id, limit))
+
+def load_run(graph, thread_id: str):
+    """Saved state of a run: ``values`` holds its results and ``next`` is empty once it finished"""
+    return run(graph.aget_state(thread_config(thread_id)))
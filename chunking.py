@@ -0,0 +1,106 @@
+import os
+import re
+import string
+import unicodedata
+from typing import List
+
+from graph import VerifiedFact
+
+# Materials longer than this are split into chunks for map-reduce extraction
+CHUNK_CHARS = int(os.getenv("LOR_CHUNK_CHARS", "12000"))
+
+# Claims at least this similar (after normalization) are treated as duplicates
+DUPLICATE_SIMILARITY = float(os.getenv("LOR_DUPLICATE_SIMILARITY", "0.85"))
+
+# "=== Content from PDF ===" style headers written by main.py
+SECTION_HEADER = re.compile(r"^=== .+ ===[ \t]*$", re.M)
+
+# Page breaks (form feeds from pdf_extract) and blank lines separate blocks
+BLOCK_BOUNDARY = re.compile(r"\f|\n[ \t]*\n")
+
+CONFIDENCE_RANK = {"high": 3, "medium": 2, "low": 1}
+
+def _split_sections(text: str) -> List[str]:
+    starts = [m.start() for m in SECTION_HEADER.finditer(text)]
+    if not starts or starts[0] != 0:
+        starts = [0] + starts
+    return [text[start:end] for start, end in zip(starts, starts[1:] + [len(text)]) if text[start:end].strip()]
+
+def _split_block(block: str, max_chars: int) -> List[str]:
+    """Split an oversized block on line boundaries, hard-splitting only single huge lines"""
+    pieces, current = [], ""
+    for line in block.splitlines(keepends=True):
+        if len(line) > max_chars and current:
+            # Flush buffered lines first so pieces stay in text order
+            pieces.append(current)
+            current = ""
+        while len(line) > max_chars:
+            pieces.append(line[:max_chars])
+            line = line[max_chars:]
+        if len(current) + len(line) > max_chars and current:
+            pieces.append(current)
+            current = ""
+        current += line
+    if current:
+        pieces.append(current)
+    return pieces
+
+def split_materials(text: str, max_chars: int = CHUNK_CHARS) -> List[str]:
+    """Split raw materials into chunks of at most ``max_chars`` characters.
+
+    Chunks break on section headers first, then on page breaks and blank
+    lines, and only then on line boundaries. Each chunk of a split section
+    repeats the section header so the model keeps its context.
+    """
+    if len(text) <= max_chars:
+        return [text]
+
+    chunks, current = [], ""
+    for section in _split_sections(text):
+        if len(section) > max_chars:
+            header_match = SECTION_HEADER.match(section)
+            header = header_match.group(0) + "\n" if header_match else ""
+            body = section[len(header):] if header else section
+            budget = max_chars - len(header)
+            blocks = []
+            for block in BLOCK_BOUNDARY.split(body):
+                if block.strip():
+                    blocks.extend(_split_block(block.strip() + "\n", budget))
+            section_chunks = []
+            for block in blocks:
+                if section_chunks and len(section_chunks[-1]) + len(block) + 1 <= budget:
+                    section_chunks[-1] += "\n" + block
+                else:
+                    section_chunks.append(block)
+            if current:
+                chunks.append(current)
+                current = ""
+            chunks.extend(header + chunk for chunk in section_chunks)
+        elif len(current) + len(section) > max_chars:
+            chunks.append(current)
+            current = section
+        else:
+            current += section
+    if current:
+        chunks.append(current)
+    return chunks
+
+def normalize_claim(claim: str) -> str:
+    claim = unicodedata.normalize("NFKC", claim).lower()
+    claim = claim.translate(str.maketrans("", "", string.punctuation + "，。、；：！？「」（）"))
+    return re.sub(r"\s+", " ", claim).strip()
+
+def merge_facts(fact_lists: List[List[VerifiedFact]],
+                threshold: float = DUPLICATE_SIMILARITY) -> List[VerifiedFact]:
+    """Merge per-chunk fact lists, keeping one fact per group of near-duplicate claims.
+
+    When duplicates disagree, the fact with the higher confidence wins; the
+    order of first appearance is preserved.
+    """
+    # Imported here to avoid a circular dependency
+    from facts import FactStore
+
+    store = FactStore(threshold=threshold)
+    for facts in fact_lists:
+        store.extend(facts)
+    return store.to_verified_facts()
@@ -0,0 +1,35 @@
+import asyncio
+import threading
+from typing import AsyncIterator, Awaitable, Iterator, Optional, TypeVar
+
+T = TypeVar("T")
+
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_lock = threading.Lock()
+
+def get_event_loop() -> asyncio.AbstractEventLoop:
+    """Return the process-wide event loop, started on a daemon thread on first use.
+
+    Every Streamlit session submits its graph runs here, so their network I/O
+    is multiplexed over one loop and one pool of async HTTP connections
+    instead of each session holding a worker thread for the whole pipeline.
+    """
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name="lor-event-loop", daemon=True).start()
+            _loop = loop
+        return _loop
+
+def run(coro: Awaitable[T], timeout: Optional[float] = None) -> T:
+    """Run a coroutine on the shared loop and wait for its result"""
+    return asyncio.run_coroutine_threadsafe(coro, get_event_loop()).result(timeout)
+
+def iterate(agen: AsyncIterator[T]) -> Iterator[T]:
+    """Consume an async iterator on the shared loop from synchronous code"""
+    while True:
+        try:
+            yield run(agen.__anext__())
+        except StopAsyncIteration:
+            return
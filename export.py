@@ -0,0 +1,133 @@
+import hashlib
+import io
+import os
+import threading
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from docx import Document
+from docx.oxml.ns import qn
+from fpdf import FPDF
+
+# MIME type and file extension per export format
+EXPORT_FORMATS = {
+    "txt": ("text/plain", "txt"),
+    "docx": ("application/vnd.openxmlformats-officedocument.wordprocessingml.document", "docx"),
+    "pdf": ("application/pdf", "pdf"),
+}
+
+# TrueType fonts with Traditional Chinese glyphs, tried in order after LOR_CJK_FONT_PATH
+CJK_FONT_CANDIDATES = (
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "fonts", "NotoSansTC-Regular.ttf"),
+    "/usr/share/fonts/truetype/noto/NotoSansTC-Regular.ttf",
+    "/usr/share/fonts/truetype/droid/DroidSansFallbackFull.ttf",
+    "/usr/share/fonts/truetype/arphic/uming.ttf",
+    "/Library/Fonts/Arial Unicode.ttf",
+    "/System/Library/Fonts/Supplemental/Arial Unicode.ttf",
+    "C:/Windows/Fonts/kaiu.ttf",
+)
+
+# Word font used for East Asian text in 繁體中文 letters
+DOCX_CJK_FONT = "Microsoft JhengHei"
+
+# Typographic punctuation that the built-in latin-1 PDF fonts cannot encode
+_ASCII_PUNCTUATION = str.maketrans({
+    "\u2018": "'", "\u2019": "'", "\u201c": '"', "\u201d": '"',
+    "\u2013": "-", "\u2014": "-", "\u2026": "...", "\u00a0": " ",
+})
+
+MAX_RENDERED = 64
+
+class ExportError(Exception):
+    """Raised when a letter cannot be rendered in the requested format"""
+
+def find_unicode_font() -> Optional[str]:
+    configured = os.getenv("LOR_CJK_FONT_PATH")
+    for path in ((configured,) if configured else ()) + CJK_FONT_CANDIDATES:
+        if os.path.isfile(path):
+            return path
+    return None
+
+def _is_latin1(text: str) -> bool:
+    try:
+        text.encode("latin-1")
+        return True
+    except UnicodeEncodeError:
+        return False
+
+def pdf_export_available(letter: str) -> bool:
+    """Whether the letter can be rendered to PDF without losing characters"""
+    return _is_latin1(letter.translate(_ASCII_PUNCTUATION)) or find_unicode_font() is not None
+
+def render_txt(letter: str) -> bytes:
+    return letter.encode("utf-8")
+
+def render_docx(letter: str, language: str = "English") -> bytes:
+    doc = Document()
+    if language != "English":
+        # Word needs an explicit East Asian font or it falls back per character
+        normal = doc.styles["Normal"]
+        normal.font.name = DOCX_CJK_FONT
+        normal.element.rPr.rFonts.set(qn("w:eastAsia"), DOCX_CJK_FONT)
+
+    for line in letter.split("\n"):
+        doc.add_paragraph(line)
+
+    buffer = io.BytesIO()
+    doc.save(buffer)
+    return buffer.getvalue()
+
+def render_pdf(letter: str) -> bytes:
+    pdf = FPDF()
+    pdf.add_page()
+
+    text = letter.translate(_ASCII_PUNCTUATION)
+    line_height = 5
+    if _is_latin1(text):
+        pdf.set_font("Arial", size=11)
+    else:
+        font_path = find_unicode_font()
+        if font_path is None:
+            raise ExportError(
+                "No Unicode TrueType font found for PDF export; set LOR_CJK_FONT_PATH to a .ttf font"
+            )
+        pdf.add_font("LetterUnicode", "", font_path, uni=True)
+        pdf.set_font("LetterUnicode", size=11)
+        text = letter
+        line_height = 6  # leave room for CJK glyphs
+
+    # Add text with proper line breaks
+    for line in text.split("\n"):
+        if line.strip():
+            pdf.multi_cell(0, line_height, txt=line)
+        else:
+            pdf.ln(3)
+
+    return pdf.output(dest="S").encode("latin-1")
+
+_rendered: "OrderedDict[Tuple[str, str, str], bytes]" = OrderedDict()
+_rendered_lock = threading.Lock()
+
+def render_letter(letter: str, fmt: str, language: str = "English") -> bytes:
+    """Render a letter to ``fmt`` ("txt", "docx" or "pdf"), memoized per letter hash and format"""
+    if fmt not in EXPORT_FORMATS:
+        raise ExportError(f"Unsupported export format: {fmt}")
+
+    key = (hashlib.sha256(letter.encode("utf-8")).hexdigest(), fmt, language)
+    with _rendered_lock:
+        if key in _rendered:
+            _rendered.move_to_end(key)
+            return _rendered[key]
+
+    if fmt == "txt":
+        data = render_txt(letter)
+    elif fmt == "docx":
+        data = render_docx(letter, language)
+    else:
+        data = render_pdf(letter)
+
+    with _rendered_lock:
+        _rendered[key] = data
+        while len(_rendered) > MAX_RENDERED:
+            _rendered.popitem(last=False)
+    return data
@@ -0,0 +1,120 @@
+import difflib
+import hashlib
+import re
+from functools import lru_cache
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+from chunking import CONFIDENCE_RANK, DUPLICATE_SIMILARITY, normalize_claim
+from graph import VerifiedFact
+
+# "[F3]" or "[F1, F4]" after a sentence, naming the facts that support it
+CITATION = re.compile(r"\s*\[(F\d+(?:\s*,\s*F\d+)*)\]")
+
+# Citations placed after the sentence's closing punctuation, moved before it so
+# they stay with their sentence when the letter is split
+_TRAILING_CITATIONS = re.compile(r"([.!?。！？])((?:\s*\[F\d+(?:\s*,\s*F\d+)*\])+)")
+
+class Fact(NamedTuple):
+    id: str  # "F1", "F2", ... in insertion order
+    claim: str
+    evidence: str
+    confidence: str
+
+class FactStore:
+    """Deduplicated, ID-addressed fact list shared by drafting and verification.
+
+    Claims are normalized on insertion and near-duplicates (difflib ratio at
+    least ``threshold``) collapse onto the existing fact, which keeps its ID
+    and takes the higher-confidence wording. Rendered prompt blocks are cached
+    until the next insertion.
+    """
+
+    __slots__ = ("threshold", "_facts", "_keys", "_exact", "_rendered")
+
+    def __init__(self, facts: Iterable = (), threshold: float = DUPLICATE_SIMILARITY):
+        self.threshold = threshold
+        self._facts: List[Fact] = []
+        self._keys: List[str] = []
+        self._exact: Dict[str, int] = {}
+        self._rendered: Dict[Optional[Tuple[str, ...]], str] = {}
+        self.extend(facts)
+
+    def add(self, fact) -> str:
+        """Insert a VerifiedFact (or Fact) and return the ID it is stored under"""
+        key = normalize_claim(fact.claim)
+        index = self._exact.get(key)
+        if index is None:
+            for i, existing in enumerate(self._keys):
+                if difflib.SequenceMatcher(None, key, existing).ratio() >= self.threshold:
+                    index = i
+                    break
+        if index is None:
+            index = len(self._facts)
+            self._facts.append(Fact(f"F{index + 1}", fact.claim, fact.evidence, fact.confidence))
+            self._keys.append(key)
+            self._rendered.clear()
+        elif CONFIDENCE_RANK.get(fact.confidence, 0) > CONFIDENCE_RANK.get(self._facts[index].confidence, 0):
+            self._facts[index] = Fact(self._facts[index].id, fact.claim, fact.evidence, fact.confidence)
+            self._rendered.clear()
+        self._exact[key] = index
+        return self._facts[index].id
+
+    def extend(self, facts: Iterable) -> None:
+        for fact in facts:
+            self.add(fact)
+
+    def get(self, fact_id: str) -> Optional[Fact]:
+        index = int(fact_id[1:]) - 1 if fact_id[1:].isdigit() else -1
+        return self._facts[index] if 0 <= index < len(self._facts) else None
+
+    def index_of(self, fact_id: str) -> int:
+        return int(fact_id[1:]) - 1
+
+    def __contains__(self, fact_id: str) -> bool:
+        return self.get(fact_id) is not None
+
+    def __iter__(self) -> Iterator[Fact]:
+        return iter(self._facts)
+
+    def __len__(self) -> int:
+        return len(self._facts)
+
+    def render(self, ids: Optional[Iterable[str]] = None) -> str:
+        """Prompt block for all facts, or only for ``ids``, one "[F#] claim" line each"""
+        key = None if ids is None else tuple(sorted(set(ids), key=self.index_of))
+        if key not in self._rendered:
+            facts = self._facts if key is None else [self.get(fact_id) for fact_id in key]
+            self._rendered[key] = "\n".join(
+                f"[{f.id}] {f.claim} (evidence: {f.evidence}, confidence: {f.confidence})"
+                for f in facts if f is not None
+            )
+        return self._rendered[key]
+
+    @property
+    def digest(self) -> str:
+        """Content hash of the fact set, for cache keys"""
+        return hashlib.sha256(self.render().encode("utf-8")).hexdigest()
+
+    def to_verified_facts(self) -> List[VerifiedFact]:
+        return [VerifiedFact(claim=f.claim, evidence=f.evidence, confidence=f.confidence) for f in self._facts]
+
+@lru_cache(maxsize=32)
+def _store_for(facts: Tuple[Tuple[str, str, str], ...]) -> FactStore:
+    return FactStore(Fact("", *fact) for fact in facts)
+
+def fact_store(facts: Sequence[VerifiedFact]) -> FactStore:
+    """Store for a fact list, memoized by content so every node of a run shares one.
+
+    Treat the result as read-only; build a new FactStore to add facts.
+    """
+    return _store_for(tuple((f.claim, f.evidence, f.confidence) for f in facts))
+
+def normalize_citations(text: str) -> str:
+    return _TRAILING_CITATIONS.sub(r"\2\1", text)
+
+def strip_citations(text: str) -> str:
+    return CITATION.sub("", text)
+
+def citations(sentence: str) -> List[str]:
+    """Fact IDs cited in a sentence, in order of appearance"""
+    return [fact_id.strip() for group in CITATION.findall(sentence) for fact_id in group.split(",")]
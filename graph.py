@@ -1,6 +1,11 @@
-from typing import List, Optional, TypedDict
+import operator
+from typing import Annotated, List, Optional, TypedDict
 from pydantic import BaseModel, Field
 from langgraph.graph import StateGraph, END
+from langgraph.types import Send
+
+# Tag carried by LLM calls whose tokens make up the letter shown to the user
+LETTER_STREAM_TAG = "letter_stream"
 
 class VerifiedFact(BaseModel):
     claim: str
@@ -14,41 +19,187 @@ class LoRState(TypedDict):
 
     raw_materials: str  # CV, notes, bullets
     verified_facts: List[VerifiedFact]
+    facts_text: Optional[str]  # verified facts rendered once for all prompts
 
     draft_letter: Optional[str]
+    cited_draft: Optional[str]  # draft_letter with its [F#] fact citations, used by verify and revise
 
     hallucination_risk: Optional[str]  # low, medium, high
     unsupported_sentences: Optional[List[str]]
 
-def build_graph(api_key: str = None, language: str = "English"):
-    """Build and return the LangGraph workflow for recommendation letter generation"""
+    revision_count: int  # completed revise rounds, capped by agents.MAX_REVISIONS
+
+class LetterRequest(TypedDict):
+    target_program: str
+    recommender_role: str
+
+class FanoutState(TypedDict):
+    candidate_name: str
+    raw_materials: str
+    verified_facts: List[VerifiedFact]
+    facts_text: Optional[str]
+
+    letter_requests: List[LetterRequest]  # one letter per target program / role
+    letters: Annotated[List[LoRState], operator.add]  # finished letters, in completion order
+
+def build_graph(api_key: str = None, language: str = "English", model: str = "gpt-4o", llm=None,
+                checkpointer=None, speculative_drafts: int = None, node_llms: dict = None):
+    """Build and return the LangGraph workflow for recommendation letter generation.
+
+    With a ``checkpointer`` (see ``checkpoints.create_checkpointer``), state is saved
+    after every node under the ``thread_id`` in the run config, so an interrupted run
+    resumes from its last completed node when invoked again with ``None`` as input.
+
+    With ``speculative_drafts`` > 1 (default LOR_SPECULATIVE_DRAFTS) the first
+    draft is written that many times concurrently and the lowest-risk one is kept.
+
+    ``node_llms`` gives extraction and verification smaller clients that
+    escalate to ``llm`` when unsure (see ``agents.NODE_MODELS``).
+    """
     # Import here to avoid circular dependency
-    from agents import create_agents_with_api_key
+    from agents import create_agent_nodes
+    from telemetry import traced_node
 
-    # Create agents with the provided API key and language
-    fact_extraction_agent, drafting_agent, verification_agent, decision = create_agents_with_api_key(api_key, language)
+    # Each node has a sync and an async agent, so the graph supports invoke and ainvoke
+    agents = create_agent_nodes(api_key, language, model, llm, speculative_drafts, node_llms)
 
     graph = StateGraph(LoRState)
 
-    graph.add_node("fact_extraction", fact_extraction_agent)
-    graph.add_node("draft", drafting_agent)
-    graph.add_node("verify", verification_agent)
-
+    # Each node records its wall time on the run's RunTrace when one is configured
+    graph.add_node("fact_extraction", traced_node("fact_extraction", *agents["fact_extraction"]))
     graph.set_entry_point("fact_extraction")
+    graph.add_edge("fact_extraction", _add_letter_nodes(graph, agents))
+
+    return graph.compile(checkpointer=checkpointer)
+
+def _add_letter_nodes(graph: StateGraph, agents: dict) -> str:
+    """Add the draft -> verify -> revise loop to a graph and return its entry node"""
+    from telemetry import traced_node
+
+    graph.add_node("draft", traced_node("draft", *agents["draft"]))
+    graph.add_node("verify", traced_node("verify", *agents["verify"]))
 
-    graph.add_edge("fact_extraction", "draft")
     graph.add_edge("draft", "verify")
 
     graph.add_conditional_edges(
         "verify",
-        decision,
+        agents["decision"],
+        {
+            "revise": "draft",
+            "final": END
+        }
+    )
+
+    if "speculate" not in agents:
+        return "draft"
+
+    # Speculative first drafts arrive already verified; only revisions go through draft
+    graph.add_node("speculate", traced_node("speculate", *agents["speculate"]))
+    graph.add_conditional_edges(
+        "speculate",
+        agents["decision"],
         {
             "revise": "draft",
             "final": END
         }
     )
+    return "speculate"
+
+def build_fanout_graph(api_key: str = None, language: str = "English", model: str = "gpt-4o", llm=None,
+                       checkpointer=None, speculative_drafts: int = None, node_llms: dict = None):
+    """Build a workflow that extracts facts once and drafts one letter per entry of
+    ``letter_requests``, running the draft -> verify loops in parallel branches.
+
+    Letter subgraphs inherit the ``checkpointer``, so on resume finished letters are
+    kept and only the unfinished branches run again.
+    """
+    from agents import create_agent_nodes
+    from langchain_core.runnables import RunnableLambda
+    from telemetry import traced_node
+
+    agents = create_agent_nodes(api_key, language, model, llm, speculative_drafts, node_llms)
+
+    # Each branch runs its own compiled draft -> verify -> revise loop
+    letter_graph = StateGraph(LoRState)
+    letter_graph.set_entry_point(_add_letter_nodes(letter_graph, agents))
+    letter_graph = letter_graph.compile()
+
+    extract, aextract = agents["fact_extraction"]
+
+    def fact_extraction(state: FanoutState) -> dict:
+        result = extract(dict(state))
+        return {"verified_facts": result["verified_facts"], "facts_text": result["facts_text"]}
+
+    async def afact_extraction(state: FanoutState) -> dict:
+        result = await aextract(dict(state))
+        return {"verified_facts": result["verified_facts"], "facts_text": result["facts_text"]}
+
+    def fan_out(state: FanoutState) -> List[Send]:
+        return [
+            Send("letter", {
+                "candidate_name": state["candidate_name"],
+                "recommender_role": request["recommender_role"],
+                "target_program": request["target_program"],
+                "raw_materials": state["raw_materials"],
+                "verified_facts": state["verified_facts"],
+                "facts_text": state["facts_text"],
+                "draft_letter": None,
+                "cited_draft": None,
+                "hallucination_risk": None,
+                "unsupported_sentences": None,
+                "revision_count": 0
+            })
+            for request in state["letter_requests"]
+        ]
+
+    def letter(state: LoRState, config) -> dict:
+        return {"letters": [letter_graph.invoke(state, config)]}
+
+    async def aletter(state: LoRState, config) -> dict:
+        return {"letters": [await letter_graph.ainvoke(state, config)]}
+
+    graph = StateGraph(FanoutState)
+    graph.add_node("fact_extraction", traced_node("fact_extraction", fact_extraction, afact_extraction))
+    graph.add_node("letter", RunnableLambda(letter, afunc=aletter, name="letter"))
+    graph.set_entry_point("fact_extraction")
+    graph.add_conditional_edges("fact_extraction", fan_out, ["letter"])
+    graph.add_edge("letter", END)
+
+    return graph.compile(checkpointer=checkpointer)
+
+def _letter_events(chunk, metadata: dict, streams: list) -> list:
+    """Events for one streamed message chunk. ``streams`` holds the ids of the letter
+    drafts seen so far: a new draft (a full redraft, or a retried attempt) starts with
+    ("reset", None), and late tokens from a draft that was superseded are dropped."""
+    if LETTER_STREAM_TAG not in metadata.get("tags", []) or not chunk.content:
+        return []
+    if chunk.id not in streams:
+        streams.append(chunk.id)
+        return ([("reset", None)] if len(streams) > 1 else []) + [("token", chunk.content)]
+    return [("token", chunk.content)] if chunk.id == streams[-1] else []
+
+def stream_generation(graph, initial_state: LoRState, config: dict = None):
+    """Run the workflow, yielding ("token", text) for each letter token as it is drafted,
+    ("reset", None) when a new draft replaces the one streamed so far, and finally
+    ("state", final_state) once verification has finished"""
+    final_state, streams = None, []
+    for mode, payload in graph.stream(initial_state, config, stream_mode=["messages", "values"]):
+        if mode == "messages":
+            yield from _letter_events(*payload, streams)
+        else:
+            final_state = payload
+    yield "state", final_state
 
-    return graph.compile()
+async def astream_generation(graph, initial_state: LoRState, config: dict = None):
+    """Async counterpart of stream_generation, driving the graph's async nodes"""
+    final_state, streams = None, []
+    async for mode, payload in graph.astream(initial_state, config, stream_mode=["messages", "values"]):
+        if mode == "messages":
+            for event in _letter_events(*payload, streams):
+                yield event
+        else:
+            final_state = payload
+    yield "state", final_state
 
 # For backward compatibility
 lor_graph = None  # Will be created when build_graph() is called
@@ -1,12 +1,15 @@
 import streamlit as st
-from graph import build_graph
+import uuid
+from checkpoints import get_checkpointer, list_runs, load_run, new_thread_id, thread_config
+from event_loop import iterate, run
+from graph import astream_generation
+from registry import get_fanout_graph, get_graph
+from telemetry import RunTrace
 from datetime import datetime
-import io
-from docx import Document
-from fpdf import FPDF
+from export import EXPORT_FORMATS, pdf_export_available, render_letter
 import os
 from dotenv import load_dotenv
-from PyPDF2 import PdfReader
+from pdf_extract import MAX_CHARS, extract_pdf_text
 
 # Load environment variables
 load_dotenv()
@@ -17,6 +20,11 @@ st.set_page_config(
     layout="wide"
 )
 
+@st.cache_data(show_spinner=False, max_entries=32)
+def cached_pdf_extraction(data: bytes):
+    """Extract PDF text once per distinct file content, shared across reruns"""
+    return extract_pdf_text(data)
+
 # Initialize session state
 if 'generated_letter' not in st.session_state:
     st.session_state.generated_letter = None
@@ -26,6 +34,40 @@ if 'unsupported_sentences' not in st.session_state:
     st.session_state.unsupported_sentences = None
 if 'verified_facts' not in st.session_state:
     st.session_state.verified_facts = None
+if 'timing' not in st.session_state:
+    st.session_state.timing = None
+if 'letters' not in st.session_state:
+    st.session_state.letters = None
+
+# Graph state is checkpointed per run under a session id kept in the URL, so an
+# interrupted generation survives reruns and restarts and past runs can be reloaded
+if 'session' not in st.query_params:
+    st.query_params['session'] = uuid.uuid4().hex[:12]
+session_id = st.query_params['session']
+checkpointer = get_checkpointer()
+
+def store_result(values: dict) -> None:
+    """Show the results of a finished run, fresh or restored from a checkpoint"""
+    if values.get("letters"):
+        programs = [request["target_program"] for request in values["letter_requests"]]
+        letters = sorted(values["letters"], key=lambda l: programs.index(l["target_program"]))
+        st.session_state.letters = [
+            {
+                "target_program": l["target_program"],
+                "draft_letter": l.get("draft_letter", ""),
+                "hallucination_risk": l.get("hallucination_risk", "unknown"),
+                "unsupported_sentences": l.get("unsupported_sentences", [])
+            }
+            for l in letters
+        ]
+        result = dict(letters[0], verified_facts=values["verified_facts"])
+    else:
+        st.session_state.letters = None
+        result = values
+    st.session_state.generated_letter = result.get("draft_letter", "")
+    st.session_state.hallucination_risk = result.get("hallucination_risk", "unknown")
+    st.session_state.unsupported_sentences = result.get("unsupported_sentences", [])
+    st.session_state.verified_facts = result.get("verified_facts", [])
 
 # Sidebar - Language selection first
 st.sidebar.title("Configuration")
@@ -70,6 +112,31 @@ recommender_role = st.sidebar.selectbox(
     help="Select your role as a recommender" if language == "English" else "選擇您作為推薦人的角色"
 )
 
+show_timing = st.sidebar.checkbox(
+    "Show timing breakdown" if language == "English" else "顯示耗時明細",
+    help="Show per-step latency, tokens and cost for the last generation" if language == "English" else "顯示上次生成各步驟的耗時、權杖數與費用"
+)
+
+# Runs saved for this session; loading one replays its checkpoint without LLM calls. The
+# list is queried once per session and refreshed after a generation or load, not on every rerun
+if 'past_runs' not in st.session_state:
+    st.session_state.past_runs = list_runs(checkpointer, session_id)
+past_runs = st.session_state.past_runs
+current_run = next((r for r in past_runs if r["thread_id"] == st.query_params.get("run")), None)
+if past_runs:
+    selected_run = st.sidebar.selectbox(
+        "Past runs" if language == "English" else "過往生成紀錄",
+        past_runs,
+        format_func=lambda r: f"{r['candidate_name']} - {r['target_program']}"
+    )
+    if st.sidebar.button("Load run" if language == "English" else "載入紀錄", use_container_width=True):
+        st.query_params["run"] = selected_run["thread_id"]
+        current_run = selected_run
+        st.session_state.past_runs = list_runs(checkpointer, session_id)
+        st.session_state.generated_letter = None
+        st.session_state.letters = None
+        st.session_state.timing = None
+
 st.sidebar.markdown("---")
 if language == "English":
     st.sidebar.markdown("""
@@ -115,6 +182,13 @@ with col1:
         help="Enter the program or position the candidate is applying for" if language == "English" else "輸入候選人申請的項目或職位"
     )
 
+    additional_programs = st.text_area(
+        "Additional Target Programs (optional, one per line)" if language == "English" else "其他目標項目（選填，每行一個）",
+        placeholder="e.g., PhD in Computer Science at Stanford" if language == "English" else "例如：清華大學資訊工程博士班",
+        help="One letter is written per program, reusing a single fact extraction" if language == "English" else "每個項目各生成一封推薦信，共用同一次事實提取",
+        height=100
+    )
+
     st.markdown("### Upload PDF or Enter Text" if language == "English" else "### 上傳 PDF 或輸入文字")
 
     # PDF upload option
@@ -136,14 +210,27 @@ with col1:
     pdf_text = ""
     if uploaded_file is not None:
         try:
-            pdf_reader = PdfReader(uploaded_file)
-            pdf_text = ""
-            for page in pdf_reader.pages:
-                pdf_text += page.extract_text() + "\n"
+            extraction = cached_pdf_extraction(uploaded_file.getvalue())
+            pdf_text = extraction.text
             if language == "English":
-                st.success(f"PDF uploaded successfully! Extracted {len(pdf_text)} characters from {len(pdf_reader.pages)} pages.")
+                st.success(f"PDF uploaded successfully! Extracted {len(pdf_text)} characters from {extraction.pages_read} pages.")
             else:
-                st.success(f"PDF 上傳成功！從 {len(pdf_reader.pages)} 頁中提取了 {len(pdf_text)} 個字元。")
+                st.success(f"PDF 上傳成功！從 {extraction.pages_read} 頁中提取了 {len(pdf_text)} 個字元。")
+            if extraction.cleanup_reduction > 0:
+                sections = ", ".join(extraction.sections)
+                if language == "English":
+                    st.caption(f"Layout cleanup removed {extraction.cleanup_reduction:.0%} of the raw page text"
+                               + (f"; sections found: {sections}" if sections else ""))
+                else:
+                    st.caption(f"版面清理移除了 {extraction.cleanup_reduction:.0%} 的原始頁面文字"
+                               + (f"；偵測到的段落：{sections}" if sections else ""))
+            if extraction.truncated:
+                if language == "English":
+                    st.warning(f"PDF truncated: used {extraction.pages_read} of {extraction.total_pages} pages and "
+                               f"{len(pdf_text)} of {extraction.total_chars} characters (limit {MAX_CHARS}).")
+                else:
+                    st.warning(f"PDF 已截斷：使用了 {extraction.total_pages} 頁中的 {extraction.pages_read} 頁，"
+                               f"{extraction.total_chars} 個字元中的 {len(pdf_text)} 個（上限 {MAX_CHARS}）。")
         except Exception as e:
             st.error(f"Error reading PDF: {str(e)}" if language == "English" else f"讀取 PDF 時發生錯誤：{str(e)}")
 
@@ -157,7 +244,32 @@ with col1:
 with col2:
     st.subheader("Generated Recommendation Letter" if language == "English" else "生成的推薦信")
 
-    if generate_button:
+    def run_graph(kind: str):
+        # Reuse the compiled graph for this key and language
+        if kind == "fanout":
+            return get_fanout_graph(api_key, language, checkpointer=checkpointer)
+        return get_graph(api_key, language, checkpointer=checkpointer)
+
+    # Restore the session's current run after a restart, or offer to resume it if it was interrupted
+    resume_button = False
+    if current_run and api_key and not st.session_state.generated_letter:
+        snapshot = load_run(run_graph(current_run["kind"]), current_run["thread_id"])
+        if snapshot.next:
+            st.info(f"The generation for {current_run['candidate_name']} was interrupted." if language == "English"
+                    else f"{current_run['candidate_name']} 的推薦信生成已中斷。")
+            resume_button = st.button(
+                "Resume Generation" if language == "English" else "繼續生成",
+                use_container_width=True
+            )
+        elif snapshot.values:
+            store_result(snapshot.values)
+
+    run_request = None
+    if resume_button:
+        # Continue from the last completed step; None as input resumes the checkpointed thread
+        run_request = (current_run["kind"], current_run["thread_id"], None,
+                       current_run["candidate_name"], current_run["target_program"])
+    elif generate_button:
         # Check API key first
         if not api_key:
             st.error("Please enter your OpenAI API key in the sidebar" if language == "English" else "請在側邊欄輸入您的 OpenAI API 密鑰")
@@ -173,34 +285,100 @@ with col2:
             if not candidate_name or not target_program or not combined_materials.strip():
                 st.error("Please fill in all required fields marked with * and provide either a PDF or text input" if language == "English" else "請填寫所有標有 * 的必填欄位，並提供 PDF 或文字輸入")
             else:
-                with st.spinner("Generating your recommendation letter..." if language == "English" else "正在生成您的推薦信..."):
-                    try:
-                        # Build graph and prepare state
-                        graph = build_graph(api_key, language)
-
-                        initial_state = {
-                            "candidate_name": candidate_name,
-                            "recommender_role": recommender_role,
-                            "target_program": target_program,
-                            "raw_materials": combined_materials,
-                            "verified_facts": [],
-                            "draft_letter": None,
-                            "hallucination_risk": None,
-                            "unsupported_sentences": None
-                        }
-
-                        # Run the workflow
-                        result = graph.invoke(initial_state)
-
-                        # Store results in session state
-                        st.session_state.generated_letter = result.get("draft_letter", "")
-                        st.session_state.hallucination_risk = result.get("hallucination_risk", "unknown")
-                        st.session_state.unsupported_sentences = result.get("unsupported_sentences", [])
-                        st.session_state.verified_facts = result.get("verified_facts", [])
-
-                    except Exception as e:
-                        st.error(f"Error generating letter: {str(e)}" if language == "English" else f"生成推薦信時發生錯誤：{str(e)}")
-                        st.exception(e)
+                programs = list(dict.fromkeys(
+                    [target_program] + [p.strip() for p in additional_programs.splitlines() if p.strip()]
+                ))
+
+                if len(programs) > 1:
+                    # Extract facts once, then draft and verify one letter per program in parallel
+                    initial_state = {
+                        "candidate_name": candidate_name,
+                        "raw_materials": combined_materials,
+                        "verified_facts": [],
+                        "letter_requests": [
+                            {"target_program": program, "recommender_role": recommender_role}
+                            for program in programs
+                        ],
+                        "letters": []
+                    }
+                    kind = "fanout"
+                else:
+                    initial_state = {
+                        "candidate_name": candidate_name,
+                        "recommender_role": recommender_role,
+                        "target_program": target_program,
+                        "raw_materials": combined_materials,
+                        "verified_facts": [],
+                        "draft_letter": None,
+                        "cited_draft": None,
+                        "hallucination_risk": None,
+                        "unsupported_sentences": None,
+                        "revision_count": 0
+                    }
+                    kind = "letter"
+
+                # Each generation gets its own checkpoint thread, remembered in the URL
+                thread_id = new_thread_id(session_id)
+                st.query_params["run"] = thread_id
+                run_request = (kind, thread_id, initial_state, candidate_name, ", ".join(programs))
+
+    if run_request:
+        kind, thread_id, initial_state, run_candidate, run_programs = run_request
+        # Cleared until the run finishes, so a failed run is offered for resumption on the next rerun
+        st.session_state.generated_letter = None
+        st.session_state.letters = None
+        with st.spinner("Generating your recommendation letter..." if language == "English" else "正在生成您的推薦信..."):
+            try:
+                trace = RunTrace()
+                config = trace.config(thread_config(
+                    thread_id, lor_session=session_id, kind=kind,
+                    candidate_name=run_candidate, target_program=run_programs
+                ))
+                graph = run_graph(kind)
+
+                if kind == "fanout":
+                    result = run(graph.ainvoke(initial_state, config))
+                else:
+                    # Run the workflow, showing the draft as it is written
+                    result = {}
+
+                    # Runs on the shared event loop; this thread only relays tokens. A full
+                    # redraft restarts the stream area instead of appending to the first letter
+                    stream_area = st.empty()
+                    streamed = ""
+                    for token_kind, payload in iterate(astream_generation(graph, initial_state, config)):
+                        if token_kind == "token":
+                            streamed += payload
+                            stream_area.markdown(streamed)
+                        elif token_kind == "reset":
+                            streamed = ""
+                            stream_area.empty()
+                        else:
+                            result.update(payload)
+                    stream_area.empty()
+
+                # Store results in session state
+                store_result(result)
+                st.session_state.timing = trace.finish()
+
+            except Exception as e:
+                st.error(f"Error generating letter: {str(e)}" if language == "English" else f"生成推薦信時發生錯誤：{str(e)}")
+                st.exception(e)
+            # The new run, finished or resumable, shows up under past runs
+            st.session_state.past_runs = list_runs(checkpointer, session_id)
+
+    # With several target programs, choose which letter to display
+    if st.session_state.letters:
+        letters = st.session_state.letters
+        selected = st.selectbox(
+            f"Letters generated ({len(letters)})" if language == "English" else f"已生成的推薦信（{len(letters)} 封）",
+            range(len(letters)),
+            format_func=lambda i: f"{letters[i]['target_program']} ({letters[i]['hallucination_risk']} risk)"
+            if language == "English" else f"{letters[i]['target_program']}（風險：{letters[i]['hallucination_risk']}）"
+        )
+        st.session_state.generated_letter = letters[selected]["draft_letter"]
+        st.session_state.hallucination_risk = letters[selected]["hallucination_risk"]
+        st.session_state.unsupported_sentences = letters[selected]["unsupported_sentences"]
 
     # Display generated letter
     if st.session_state.generated_letter:
@@ -240,6 +418,36 @@ with col2:
                         st.markdown(f"   - 可信度：{fact.confidence}")
                     st.markdown("---")
 
+        # Show timing breakdown for the last run
+        if show_timing and st.session_state.timing:
+            timing = st.session_state.timing
+            with st.expander("Timing Breakdown" if language == "English" else "耗時明細", expanded=True):
+                st.caption(
+                    f"Total {timing['wall_time']:.1f}s, {timing['revisions']} revision(s), "
+                    f"{timing['prompt_tokens'] + timing['completion_tokens']} tokens "
+                    f"({timing['cache_hit_rate']:.0%} of prompt tokens cached), ${timing['cost']:.4f}"
+                    if language == "English" else
+                    f"總計 {timing['wall_time']:.1f} 秒，修訂 {timing['revisions']} 次，"
+                    f"{timing['prompt_tokens'] + timing['completion_tokens']} 個權杖"
+                    f"（提示快取命中 {timing['cache_hit_rate']:.0%}），${timing['cost']:.4f}"
+                )
+                st.dataframe(
+                    [{
+                        "node": row["node"],
+                        "runs": row["runs"],
+                        "wall s": round(row["wall_time"], 2),
+                        "LLM s": round(row["llm_time"], 2),
+                        "prompt tokens": row["prompt_tokens"],
+                        "completion tokens": row["completion_tokens"],
+                        "cached %": round(100 * row["cache_hit_rate"]),
+                        "retries": row["retries"],
+                        "cost $": round(row["cost"], 4),
+                        "models": ", ".join(f"{m} x{n}" for m, n in row.get("models", {}).items()),
+                    } for row in timing["nodes"]],
+                    hide_index=True,
+                    use_container_width=True
+                )
+
         st.markdown("---")
 
         # Display letter
@@ -255,66 +463,28 @@ with col2:
         st.subheader("Export Options" if language == "English" else "匯出選項")
         col_export1, col_export2, col_export3 = st.columns(3)
 
-        with col_export1:
-            # TXT Export
-            txt_data = st.session_state.generated_letter.encode('utf-8')
-            st.download_button(
-                label="Download as TXT" if language == "English" else "下載為 TXT",
-                data=txt_data,
-                file_name=f"recommendation_letter_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt",
-                mime="text/plain",
-                use_container_width=True
-            )
-
-        with col_export2:
-            # Word Export
-            doc = Document()
-            doc.add_paragraph(st.session_state.generated_letter)
-
-            buffer = io.BytesIO()
-            doc.save(buffer)
-            buffer.seek(0)
-
-            st.download_button(
-                label="Download as Word" if language == "English" else "下載為 Word",
-                data=buffer,
-                file_name=f"recommendation_letter_{datetime.now().strftime('%Y%m%d_%H%M%S')}.docx",
-                mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document",
-                use_container_width=True
-            )
-
-        with col_export3:
-            # PDF Export
-            try:
-                pdf = FPDF()
-                pdf.add_page()
-                pdf.set_font("Arial", size=11)
-
-                # Handle text encoding for PDF
-                text = st.session_state.generated_letter
-                # Replace special characters that might cause issues
-                text = text.encode('latin-1', 'replace').decode('latin-1')
-
-                # Add text with proper line breaks
-                for line in text.split('\n'):
-                    if line.strip():
-                        pdf.multi_cell(0, 5, txt=line)
-                    else:
-                        pdf.ln(3)
-
-                pdf_buffer = io.BytesIO()
-                pdf_output = pdf.output(dest='S').encode('latin-1')
-                pdf_buffer.write(pdf_output)
-                pdf_buffer.seek(0)
+        letter = st.session_state.generated_letter
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
 
+        def export_button(column, fmt: str, label: str):
+            # Rendering is deferred until the button is clicked and memoized per letter
+            mime, extension = EXPORT_FORMATS[fmt]
+            with column:
                 st.download_button(
-                    label="Download as PDF" if language == "English" else "下載為 PDF",
-                    data=pdf_buffer,
-                    file_name=f"recommendation_letter_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf",
-                    mime="application/pdf",
+                    label=label,
+                    data=lambda: render_letter(letter, fmt, language),
+                    file_name=f"recommendation_letter_{timestamp}.{extension}",
+                    mime=mime,
                     use_container_width=True
                 )
-            except Exception as e:
-                st.error(f"PDF export error: {str(e)}" if language == "English" else f"PDF 匯出錯誤：{str(e)}")
+
+        export_button(col_export1, "txt", "Download as TXT" if language == "English" else "下載為 TXT")
+        export_button(col_export2, "docx", "Download as Word" if language == "English" else "下載為 Word")
+        if pdf_export_available(letter):
+            export_button(col_export3, "pdf", "Download as PDF" if language == "English" else "下載為 PDF")
+        else:
+            with col_export3:
+                st.warning("PDF export needs a Unicode font; set LOR_CJK_FONT_PATH" if language == "English"
+                           else "PDF 匯出需要 Unicode 字型，請設定 LOR_CJK_FONT_PATH")
     else:
         st.info("Fill in the information on the left and click 'Generate Recommendation Letter' to start" if language == "English" else "填寫左側資訊並點擊「生成推薦信」開始")
\ No newline at end of file
@@ -0,0 +1,98 @@
+import io
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
+
+from PyPDF2 import PdfReader
+
+from pdf_layout import clean_layout, clean_page
+
+# Limits on how much of a PDF is sent on to fact extraction
+MAX_PAGES = int(os.getenv("LOR_PDF_MAX_PAGES", "100"))
+MAX_CHARS = int(os.getenv("LOR_PDF_MAX_CHARS", "200000"))
+
+# Documents with at least this many pages are parsed in a process pool
+PARALLEL_PAGE_THRESHOLD = int(os.getenv("LOR_PDF_PARALLEL_PAGES", "16"))
+PDF_WORKERS = int(os.getenv("LOR_PDF_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+# Strip running headers/footers and page numbers, rejoin hyphenated words and mark CV sections
+LAYOUT_CLEANUP = os.getenv("LOR_PDF_CLEANUP", "1") == "1"
+
+@dataclass
+class PdfExtraction:
+    text: str
+    pages_read: int
+    total_pages: int
+    total_chars: int  # characters extracted before the character cap was applied
+    raw_chars: int = 0  # characters of the pages read before layout cleanup
+    sections: List[str] = field(default_factory=list)  # CV sections detected by layout cleanup
+
+    @property
+    def truncated(self) -> bool:
+        return self.pages_read < self.total_pages or len(self.text) < self.total_chars
+
+    @property
+    def cleanup_reduction(self) -> float:
+        """Share of the raw page text removed by layout cleanup"""
+        return 1 - self.total_chars / self.raw_chars if self.raw_chars else 0.0
+
+def _extract_page_range(data: bytes, start: int, stop: int, clean: bool = False) -> List[Tuple[int, str]]:
+    """(raw length, text) per page; per-page cleanup runs here so it is parallel too"""
+    reader = PdfReader(io.BytesIO(data))
+    pages = [reader.pages[i].extract_text() or "" for i in range(start, stop)]
+    return [(len(page), clean_page(page) if clean else page) for page in pages]
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        # spawn avoids forking the threads of the host process (e.g. Streamlit)
+        _pool = ProcessPoolExecutor(max_workers=PDF_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+def _extract_pages(data: bytes, page_count: int, clean: bool = False) -> List[Tuple[int, str]]:
+    if page_count < PARALLEL_PAGE_THRESHOLD or PDF_WORKERS < 2:
+        return _extract_page_range(data, 0, page_count, clean)
+
+    step = -(-page_count // PDF_WORKERS)
+    ranges = [(start, min(start + step, page_count)) for start in range(0, page_count, step)]
+    try:
+        futures = [_get_pool().submit(_extract_page_range, data, start, stop, clean) for start, stop in ranges]
+        return [page for future in futures for page in future.result()]
+    except (BrokenProcessPool, OSError):
+        global _pool
+        _pool = None
+        return _extract_page_range(data, 0, page_count, clean)
+
+def extract_pdf_text(data: bytes, max_pages: int = MAX_PAGES, max_chars: int = MAX_CHARS,
+                     clean: bool = LAYOUT_CLEANUP) -> PdfExtraction:
+    """Extract the text of a PDF, reading at most ``max_pages`` pages and ``max_chars`` characters.
+
+    With ``clean``, page furniture and hyphenation are removed and CV sections
+    are marked with "## Heading" lines, which usually cuts the tokens sent to
+    fact extraction substantially.
+    """
+    total_pages = len(PdfReader(io.BytesIO(data)).pages)
+    extracted = _extract_pages(data, min(total_pages, max_pages), clean)
+    pages = [page for _, page in extracted]
+    raw_chars = sum(length for length, _ in extracted) + 2 * len(extracted) - 1 if extracted else 0
+
+    sections = []
+    if clean:
+        text, sections = clean_layout(pages)
+        text = text + "\n" if text else ""
+    else:
+        # Pages are separated by form feeds so later stages can split on page boundaries
+        text = "\n\f".join(pages) + "\n" if pages else ""
+    return PdfExtraction(
+        text=text[:max_chars],
+        pages_read=len(pages),
+        total_pages=total_pages,
+        total_chars=len(text),
+        raw_chars=raw_chars,
+        sections=sections
+    )
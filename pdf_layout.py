@@ -0,0 +1,119 @@
+import re
+from collections import Counter
+from typing import List, Optional, Tuple
+
+# Running headers and footers are looked for among this many lines at the top and bottom of a page
+EDGE_LINES = 3
+
+# Share of pages an edge line must repeat on to be dropped as page furniture
+REPEAT_SHARE = 0.5
+
+# "3", "- 3 -", "Page 3", "Page 3 of 7", "3/7", "第 3 頁"; at most three digits, so a
+# year on its own line ("2019") is never taken for a page number
+_PAGE_NUMBER = re.compile(
+    r"^(?:page\s*)?[-–—]?\s*\d{1,3}\s*(?:(?:of|/)\s*\d{1,3})?\s*[-–—]?$|^第\s*\d+\s*頁(?:\s*[，,/]?\s*共\s*\d+\s*頁)?$",
+    re.I
+)
+
+# A word broken across lines: "distri-\nbuted"; a capitalized continuation is kept hyphenated
+_HYPHEN_BREAK = re.compile(r"(\w)-\n(?=[a-z])")
+
+# Canonical CV section -> heading pattern
+CV_SECTIONS = {
+    "Education": r"education|academic background|學歷|教育背景",
+    "Experience": r"(?:research |work |professional |teaching )?experience|employment|positions?|經歷|工作經驗|研究經驗",
+    "Publications": r"(?:selected |peer-reviewed )?publications?|papers|著作|發表|論文",
+    "Presentations": r"presentations?|(?:invited )?talks|演講",
+    "Awards": r"awards?(?: and honou?rs)?|honou?rs?(?: and awards)?|scholarships?|fellowships?|grants?|獎項|榮譽|獎學金",
+    "Skills": r"(?:technical )?skills|languages|技能|專長",
+    "Projects": r"(?:research |selected )?projects?|專案|研究計畫",
+    "Service": r"(?:professional )?service|activities|leadership|服務|社團|活動",
+    "References": r"references|推薦人",
+}
+
+_HEADINGS = [
+    (name, re.compile(rf"^(?:\d+[.)]\s*)?(?:{pattern})\s*[:：]?$", re.I))
+    for name, pattern in CV_SECTIONS.items()
+]
+
+def clean_page(text: str) -> str:
+    """Per-page cleanup: rejoin hyphenated words, drop page numbers and collapse whitespace.
+
+    Only the first and last EDGE_LINES lines of a page can be page numbers;
+    bare numbers elsewhere (list items, scores) are content.
+    """
+    text = _HYPHEN_BREAK.sub(r"\1", text.replace("\r\n", "\n"))
+    raw = [re.sub(r"[ \t\u00a0]+", " ", line).strip() for line in text.split("\n")]
+    content = [i for i, line in enumerate(raw) if line]
+    edges = set(content[:EDGE_LINES] + content[-EDGE_LINES:])
+    lines = []
+    for i, line in enumerate(raw):
+        if i in edges and _PAGE_NUMBER.match(line):
+            continue
+        if line or (lines and lines[-1]):
+            lines.append(line)
+    return "\n".join(lines).strip()
+
+def _furniture_key(line: str) -> str:
+    # Digits are ignored only in short lines ("Draft 3", "Updated 05/2024"), so numbered
+    # entries such as publications never match each other
+    return re.sub(r"\d+", "#", line.lower()) if len(line) <= 40 else line.lower()
+
+def _edge_lines(lines: List[str]) -> List[str]:
+    return lines[:EDGE_LINES] + lines[-EDGE_LINES:]
+
+def strip_page_furniture(pages: List[str]) -> List[str]:
+    """Remove lines repeated at the top or bottom of most pages (running headers and footers).
+
+    The first page keeps its copy, since a running header usually carries the candidate's name.
+    """
+    if len(pages) < 2:
+        return pages
+    page_lines = [[line for line in page.split("\n") if line] for page in pages]
+    counts = Counter(key for lines in page_lines for key in {_furniture_key(line) for line in _edge_lines(lines)})
+    repeated = {key for key, count in counts.items() if count >= max(2, REPEAT_SHARE * len(pages))}
+    if not repeated:
+        return pages
+
+    cleaned = pages[:1]
+    for page in pages[1:]:
+        lines = page.split("\n")
+        content = [i for i, line in enumerate(lines) if line]
+        edges = set(content[:EDGE_LINES] + content[-EDGE_LINES:])
+        cleaned.append("\n".join(
+            line for i, line in enumerate(lines) if not (i in edges and _furniture_key(line) in repeated)
+        ).strip())
+    return cleaned
+
+def section_of(line: str) -> Optional[str]:
+    """Canonical CV section a heading line introduces, if any"""
+    if len(line) > 40:
+        return None
+    for name, pattern in _HEADINGS:
+        if pattern.match(line):
+            return name
+    return None
+
+def sectioned_text(pages: List[str]) -> Tuple[str, List[str]]:
+    """Mark "## Heading" sections in cleaned pages and join them with form feeds, as
+    uncleaned extraction does; returns the text and the sections found"""
+    out_pages, found = [], []
+    for page in pages:
+        if not page:
+            continue
+        out = []
+        for line in page.split("\n"):
+            section = section_of(line)
+            if section is None:
+                out.append(line)
+                continue
+            found.append(section)
+            if out and out[-1]:
+                out.append("")
+            out.append(f"## {line.rstrip(':：').strip()}")
+        out_pages.append("\n".join(out).strip())
+    return "\n\f".join(out_pages), list(dict.fromkeys(found))
+
+def clean_layout(pages: List[str]) -> Tuple[str, List[str]]:
+    """Strip page furniture from per-page cleaned text and mark CV sections"""
+    return sectioned_text(strip_page_furniture(pages))
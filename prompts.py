@@ -0,0 +1,172 @@
+"""Prompt templates for the LoR agents.
+
+Every prompt is a static system message followed by a human message with the
+variable payload. The system text never changes between calls of the same
+kind and language, and the payload puts the per-run facts block before the
+per-call content, so provider-side prompt caching can reuse the longest
+possible prefix across letters, revise rounds and repeat runs.
+"""
+from typing import List
+
+from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage
+
+EXTRACTION = {
+    "English": """You are extracting ONLY verifiable facts for a recommendation letter.
+
+Extract factual claims with supporting evidence from the raw materials provided by the user.
+Do NOT infer or exaggerate.
+Return a JSON list of facts with the following structure:
+- claim: the factual claim
+- evidence: supporting evidence from the raw materials
+- confidence: high, medium, or low""",
+    "繁體中文": """您正在為推薦信提取可驗證的事實。
+
+從使用者提供的原始資料中提取事實性聲明及其支持證據。
+不要推斷或誇大。
+請以以下結構返回 JSON 事實列表：
+- claim: 事實性聲明
+- evidence: 來自原始資料的支持證據
+- confidence: high（高）、medium（中）或 low（低）""",
+}
+
+DRAFT = {
+    "English": """You are a recommender writing a recommendation letter. Your role, the candidate and the target program are given by the user together with the verified facts.
+
+IMPORTANT RULES:
+1. You may ONLY use the verified facts provided
+2. Do NOT add any information not explicitly stated in the facts
+3. Do NOT exaggerate or make inferences beyond what is stated
+4. Write in a formal, professional tone appropriate for an academic recommendation letter
+5. Include proper letter formatting (date, salutation, body, closing)
+6. Each verified fact has an ID such as [F1]; end every sentence that uses a fact with the IDs it relies on, e.g. "... at a regional workshop [F2]."
+
+Write a complete, formal recommendation letter that:
+- Opens with your relationship to the candidate
+- Discusses specific achievements and qualities (based only on the facts)
+- Provides concrete examples from the verified facts
+- Concludes with a strong recommendation
+- Maintains a professional and sincere tone throughout
+
+Format the letter properly with appropriate sections and paragraphs.""",
+    "繁體中文": """您是一位推薦人，正在撰寫推薦信。您的角色、候選人及其申請的項目與已驗證的事實一併由使用者提供。
+
+重要規則：
+1. 您只能使用所提供的已驗證事實
+2. 不要添加任何未在事實中明確說明的資訊
+3. 不要誇大或做出超出所述內容的推論
+4. 使用適合學術推薦信的正式、專業語氣
+5. 包含適當的信件格式（日期、稱呼、正文、結語）
+6. 每個已驗證的事實都有編號，例如 [F1]；使用事實的句子請在句末標註所依據的編號，例如「……在區域研討會上發表 [F2]。」
+
+請撰寫一封完整、正式的推薦信，包含：
+- 開頭說明您與候選人的關係
+- 討論具體成就和品質（僅基於事實）
+- 從已驗證的事實中提供具體例子
+- 以強烈的推薦作為結尾
+- 始終保持專業和真誠的語氣
+
+請以適當的段落正確格式化信件。請用臺灣繁體中文撰寫整封推薦信。""",
+}
+
+REPAIR = {
+    "English": """You are revising one paragraph of a recommendation letter.
+
+Rewrite the paragraph so that every sentence is supported by the verified facts.
+Fix or remove only the sentences listed as unsupported and keep the rest unchanged.
+Keep the fact ID citations such as [F1], and cite the facts that support any sentence you rewrite.
+Return ONLY the rewritten paragraph, with no commentary.""",
+    "繁體中文": """您正在修改推薦信中的一個段落。
+
+請重寫此段落，使每個句子都有已驗證事實的支持。
+只修正或刪除列為不受支持的句子，其餘內容保持不變。
+保留 [F1] 等事實編號標註，並為重寫的句子標註所依據的事實編號。
+只返回重寫後的段落，不要加任何說明。請用臺灣繁體中文撰寫。""",
+}
+
+VERIFICATION = {
+    "English": """You are verifying sentences from a recommendation letter against verified facts.
+Any other sentences of the letter have already been checked.
+
+Your task:
+1. Check each sentence provided against the verified facts
+2. Identify any sentences that make claims not supported by the facts
+3. Determine the overall hallucination risk level
+
+Greetings, closings, dates and statements of the recommender's own opinion are not factual claims.
+
+Return:
+- hallucination_risk: "low" (if all claims are supported), "medium" (if some minor unsupported claims), or "high" (if major unsupported claims)
+- unsupported_sentences: list of sentences that are not supported by the verified facts, copied exactly""",
+    "繁體中文": """您正在對照已驗證的事實來驗證推薦信中的句子。
+信中其餘的句子已經檢查過了。
+
+您的任務：
+1. 將所提供的每個句子與已驗證的事實進行對照
+2. 識別任何未被事實支持的聲明句子
+3. 確定整體的幻覺風險等級
+
+問候語、結語、日期以及推薦人自身的意見不屬於事實性聲明。
+
+返回：
+- hallucination_risk: "low"（如果所有聲明都有支持）、"medium"（如果有一些小的不支持的聲明）或 "high"（如果有重大的不支持的聲明）
+- unsupported_sentences: 未被已驗證事實支持的句子列表，請原文照錄""",
+}
+
+# Section labels used in the variable payloads
+LABELS = {
+    "English": {
+        "materials": "Raw materials:",
+        "facts": "Verified facts:",
+        "role": "Your role:",
+        "candidate": "Candidate:",
+        "program": "Target program:",
+        "paragraph": "Paragraph:",
+        "unsupported": "Unsupported sentences:",
+        "sentences": "Sentences to check:",
+    },
+    "繁體中文": {
+        "materials": "原始資料：",
+        "facts": "已驗證的事實：",
+        "role": "您的角色：",
+        "candidate": "候選人：",
+        "program": "申請項目：",
+        "paragraph": "段落：",
+        "unsupported": "不受支持的句子：",
+        "sentences": "待檢查的句子：",
+    },
+}
+
+def _messages(system: dict, language: str, payload: str) -> List[BaseMessage]:
+    return [SystemMessage(content=system[language]), HumanMessage(content=payload)]
+
+def _bullets(items: List[str]) -> str:
+    return "\n".join(f"- {item}" for item in items)
+
+def extraction_messages(language: str, materials: str) -> List[BaseMessage]:
+    labels = LABELS[language]
+    return _messages(EXTRACTION, language, f"{labels['materials']}\n{materials}")
+
+def draft_messages(language: str, facts_text: str, recommender_role: str,
+                   candidate_name: str, target_program: str) -> List[BaseMessage]:
+    labels = LABELS[language]
+    return _messages(DRAFT, language, (
+        f"{labels['facts']}\n{facts_text}\n\n"
+        f"{labels['role']} {recommender_role}\n"
+        f"{labels['candidate']} {candidate_name}\n"
+        f"{labels['program']} {target_program}"
+    ))
+
+def repair_messages(language: str, facts_text: str, paragraph: str, sentences: List[str]) -> List[BaseMessage]:
+    labels = LABELS[language]
+    return _messages(REPAIR, language, (
+        f"{labels['facts']}\n{facts_text}\n\n"
+        f"{labels['paragraph']}\n{paragraph}\n\n"
+        f"{labels['unsupported']}\n{_bullets(sentences)}"
+    ))
+
+def verification_messages(language: str, facts_text: str, sentences: List[str]) -> List[BaseMessage]:
+    labels = LABELS[language]
+    return _messages(VERIFICATION, language, (
+        f"{labels['facts']}\n{facts_text}\n\n"
+        f"{labels['sentences']}\n{_bullets(sentences)}"
+    ))
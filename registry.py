@@ -0,0 +1,127 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+import httpx
+from langchain_core.language_models.chat_models import BaseChatModel
+
+from agents import node_models
+from backends import create_llm
+from graph import build_fanout_graph, build_graph
+from resilience import request_timeout
+
+# Bounds for the process-wide registry, overridable through the environment
+DEFAULT_MAX_ENTRIES = int(os.getenv("LOR_REGISTRY_MAX_ENTRIES", "32"))
+DEFAULT_IDLE_TTL = float(os.getenv("LOR_REGISTRY_IDLE_TTL", "1800"))
+
+def key_fingerprint(api_key: Optional[str]) -> str:
+    """Short, non-reversible fingerprint so raw API keys are never used as dict keys"""
+    return hashlib.sha256((api_key or "").encode("utf-8")).hexdigest()[:16]
+
+class _BoundedIdleCache:
+    """Thread-safe LRU mapping that also drops entries idle for longer than ``idle_ttl``"""
+
+    def __init__(self, max_entries: int, idle_ttl: float):
+        self.max_entries = max_entries
+        self.idle_ttl = idle_ttl
+        self._entries: "OrderedDict[Hashable, Tuple[Any, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_create(self, key: Hashable, factory: Callable[[], Any]) -> Any:
+        with self._lock:
+            now = time.monotonic()
+            self._evict_idle(now)
+            if key in self._entries:
+                value, _ = self._entries.pop(key)
+            else:
+                value = factory()
+            self._entries[key] = (value, now)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            return value
+
+    def _evict_idle(self, now: float) -> None:
+        expired = [k for k, (_, used) in self._entries.items() if now - used > self.idle_ttl]
+        for k in expired:
+            del self._entries[k]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+class GraphRegistry:
+    """Process-wide registry of LLM clients and compiled graphs.
+
+    Entries are keyed by (API key fingerprint, language, model, checkpointer) and
+    shared by all Streamlit sessions. Every client is built on one pooled HTTP
+    client so consecutive generations reuse open connections.
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES, idle_ttl: float = DEFAULT_IDLE_TTL):
+        self.http_client = httpx.Client(
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=20),
+            timeout=httpx.Timeout(120.0, connect=10.0)
+        )
+        self._llms = _BoundedIdleCache(max_entries, idle_ttl)
+        self._graphs = _BoundedIdleCache(max_entries, idle_ttl)
+
+    def get_llm(self, api_key: Optional[str], model: str = "gpt-4o", timeout: Optional[float] = None) -> BaseChatModel:
+        """Client for ``model``; requests time out after ``timeout`` seconds, by default the longest node deadline"""
+        key = api_key or os.getenv("OPENAI_API_KEY")
+        timeout = timeout or request_timeout()
+        return self._llms.get_or_create(
+            (key_fingerprint(key), model, timeout),
+            lambda: create_llm(key, model, http_client=self.http_client, timeout=timeout)
+        )
+
+    def get_node_llms(self, api_key: Optional[str], model: str = "gpt-4o") -> Dict[str, BaseChatModel]:
+        """Clients for the nodes that run on a smaller model than ``model``, timed to those nodes' deadlines"""
+        return {node: self.get_llm(api_key, node_model, request_timeout(node))
+                for node, node_model in node_models(model).items()}
+
+    def get_graph(self, api_key: Optional[str], language: str = "English", model: str = "gpt-4o",
+                  checkpointer=None):
+        key = api_key or os.getenv("OPENAI_API_KEY")
+        return self._graphs.get_or_create(
+            (key_fingerprint(key), language, model, id(checkpointer)),
+            lambda: build_graph(key, language, model, llm=self.get_llm(key, model), checkpointer=checkpointer,
+                                node_llms=self.get_node_llms(key, model))
+        )
+
+    def get_fanout_graph(self, api_key: Optional[str], language: str = "English", model: str = "gpt-4o",
+                         checkpointer=None):
+        key = api_key or os.getenv("OPENAI_API_KEY")
+        return self._graphs.get_or_create(
+            (key_fingerprint(key), language, model, id(checkpointer), "fanout"),
+            lambda: build_fanout_graph(key, language, model, llm=self.get_llm(key, model),
+                                       checkpointer=checkpointer, node_llms=self.get_node_llms(key, model))
+        )
+
+    def clear(self) -> None:
+        self._llms.clear()
+        self._graphs.clear()
+
+_registry: Optional[GraphRegistry] = None
+_registry_lock = threading.Lock()
+
+def get_registry() -> GraphRegistry:
+    """Return the shared registry, creating it on first use"""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = GraphRegistry()
+        return _registry
+
+def get_graph(api_key: Optional[str], language: str = "English", model: str = "gpt-4o", checkpointer=None):
+    """Return a compiled graph from the shared registry"""
+    return get_registry().get_graph(api_key, language, model, checkpointer)
+
+def get_fanout_graph(api_key: Optional[str], language: str = "English", model: str = "gpt-4o", checkpointer=None):
+    """Return a compiled multi-letter graph from the shared registry"""
+    return get_registry().get_fanout_graph(api_key, language, model, checkpointer)
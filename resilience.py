@@ -0,0 +1,381 @@
+import ast
+import asyncio
+import contextvars
+import json
+import os
+import random
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, List, Optional, Type
+
+import openai
+from langchain_core.messages import AIMessage
+from langchain_core.runnables import Runnable, RunnableConfig, RunnableLambda
+from pydantic import BaseModel, ValidationError
+
+from telemetry import current_node, current_trace
+
+# Seconds one LLM call may take across all its attempts, per node
+NODE_DEADLINES = {
+    "fact_extraction": float(os.getenv("LOR_EXTRACTION_DEADLINE", "90")),
+    "draft": float(os.getenv("LOR_DRAFT_DEADLINE", "180")),
+    "verify": float(os.getenv("LOR_VERIFICATION_DEADLINE", "60")),
+}
+DEFAULT_DEADLINE = 120.0
+
+# Retries after a failed, timed-out or unparseable attempt
+CALL_RETRIES = int(os.getenv("LOR_CALL_RETRIES", "2"))
+# Share of the deadline the first attempt may use, so healthy but slow calls are not cut
+# short; the rest is split evenly over the retries
+FIRST_ATTEMPT_SHARE = float(os.getenv("LOR_FIRST_ATTEMPT_SHARE", "0.75"))
+RETRY_BASE_DELAY = float(os.getenv("LOR_RETRY_BASE_DELAY", "0.5"))
+
+# Send a duplicate request when an attempt outlives the call's p95 latency ("0" disables it)
+HEDGE_REQUESTS = os.getenv("LOR_HEDGE_REQUESTS", "1") == "1"
+HEDGE_PERCENTILE = 95
+# Successful calls observed before hedging starts, and how many recent ones are kept
+HEDGE_MIN_SAMPLES = 20
+LATENCY_WINDOW = 200
+
+class CallTimeout(TimeoutError):
+    """An LLM call attempt ran past its share of the node deadline"""
+
+class StructuredOutputError(ValueError):
+    """A structured response could neither be parsed nor repaired locally"""
+
+# Errors worth retrying: rate limiting and transient provider/network failures
+RETRYABLE_ERRORS = (
+    openai.RateLimitError,
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.InternalServerError,
+    CallTimeout,
+)
+
+def retry_delay(error: Exception, attempt: int, base_delay: float = RETRY_BASE_DELAY) -> float:
+    """Honor Retry-After when the provider sends it, else exponential backoff with jitter"""
+    response = getattr(error, "response", None)
+    if response is not None:
+        retry_after = response.headers.get("retry-after")
+        try:
+            if retry_after is not None:
+                return float(retry_after) + random.uniform(0, base_delay)
+        except ValueError:
+            pass
+    return base_delay * (2 ** attempt) * random.uniform(0.5, 1.5)
+
+class LatencyTracker:
+    """Recent successful call latencies per call name, for hedging thresholds"""
+
+    def __init__(self, window: int = LATENCY_WINDOW):
+        self.window = window
+        self._samples: Dict[str, deque] = {}
+        self._lock = threading.Lock()
+
+    def record(self, name: str, seconds: float) -> None:
+        with self._lock:
+            self._samples.setdefault(name, deque(maxlen=self.window)).append(seconds)
+
+    def percentile(self, name: str, pct: float = HEDGE_PERCENTILE) -> Optional[float]:
+        with self._lock:
+            samples = sorted(self._samples.get(name, ()))
+        if len(samples) < HEDGE_MIN_SAMPLES:
+            return None
+        return samples[min(len(samples) - 1, int(pct / 100 * len(samples)))]
+
+LATENCIES = LatencyTracker()
+
+# Attempts of sync calls run here so they can be timed out and hedged
+_executor = ThreadPoolExecutor(max_workers=64, thread_name_prefix="lor-llm")
+
+def _count(name: str, event: str) -> None:
+    trace = current_trace()
+    if trace is not None:
+        trace.count(f"{name}_{event}")
+
+# Structured output repair
+
+_FENCE = re.compile(r"```(?:json)?\s*(.*?)(?:```|$)", re.S)
+_TRAILING_COMMA = re.compile(r",\s*([}\]])")
+
+def _close_truncated(text: str) -> str:
+    """Close the strings, arrays and objects a truncated JSON document left open"""
+    stack, in_string, escaped = [], False, False
+    for ch in text:
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch in "{[":
+            stack.append("}" if ch == "{" else "]")
+        elif ch in "}]" and stack:
+            stack.pop()
+    return text + ('"' if in_string else "") + "".join(reversed(stack))
+
+def _loads(text: str) -> Any:
+    text = text.strip()
+    start = min((i for i in (text.find("{"), text.find("[")) if i >= 0), default=-1)
+    if start < 0:
+        raise ValueError("no JSON document found")
+    text = _close_truncated(text[start:])
+    text = _TRAILING_COMMA.sub(r"\1", text)
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        # Python literals: single quotes, True/False/None
+        return ast.literal_eval(text)
+
+def _coerce(data: Any, schema: Type[BaseModel]) -> Any:
+    """Reshape near-miss payloads: a wrapper key, a bare list, stray casing or scalars"""
+    fields = schema.model_fields
+    if isinstance(data, dict) and len(data) == 1 and next(iter(data)) not in fields:
+        inner = next(iter(data.values()))
+        if isinstance(inner, dict):
+            data = inner
+    if isinstance(data, list) and len(fields) == 1:
+        data = {next(iter(fields)): data}
+    if not isinstance(data, dict):
+        return data
+    data = dict(data)
+    for name, field in fields.items():
+        value = data.get(name)
+        if getattr(field.annotation, "__origin__", None) is list:
+            if value is None:
+                data[name] = []
+            elif isinstance(value, str):
+                data[name] = [value]
+        elif isinstance(value, str) and name in ("hallucination_risk", "confidence"):
+            data[name] = value.strip().lower()
+    return data
+
+def _raw_payloads(raw: Any) -> List[Any]:
+    if not isinstance(raw, AIMessage):
+        return []
+    payloads = [call.get("args") for call in raw.tool_calls + raw.invalid_tool_calls]
+    if isinstance(raw.content, str) and raw.content.strip():
+        payloads.append(raw.content)
+    return [payload for payload in payloads if payload]
+
+def repair_structured(raw: Any, schema: Type[BaseModel]) -> Optional[BaseModel]:
+    """Best-effort local parse of a malformed structured response: code fences and
+    surrounding prose, trailing commas, truncation and near-miss field shapes"""
+    for payload in _raw_payloads(raw):
+        texts = [payload] if not isinstance(payload, str) else (
+            [match.group(1) for match in _FENCE.finditer(payload)] + [payload]
+        )
+        for text in texts:
+            try:
+                data = _loads(text) if isinstance(text, str) else text
+                return schema.model_validate(_coerce(data, schema))
+            except (ValueError, SyntaxError, TypeError, ValidationError):
+                continue
+    return None
+
+# Resilient calls
+
+class ResilientCall:
+    """One LLM call with a deadline, jittered retries and optional hedging.
+
+    ``call(input, config, cancelled)`` and ``acall(input, config)`` make one
+    attempt; sync attempts run on a worker thread so they can be timed out, and
+    ``cancelled`` is set once the caller stops waiting for them. With hedging,
+    an attempt still running after the call's p95 latency gets a duplicate
+    request and the first success wins. ``check`` turns a successful
+    attempt's result into the call's result and may raise StructuredOutputError.
+    """
+
+    def __init__(self, name: str, call: Callable, acall: Callable, deadline: float,
+                 retries: int = CALL_RETRIES, hedge: bool = HEDGE_REQUESTS,
+                 check: Optional[Callable[[Any, str], Any]] = None, retry_parse_failures: bool = True):
+        self.name = name
+        self.call = call
+        self.acall = acall
+        self.deadline = deadline
+        self.retries = retries
+        self.hedge = hedge
+        self.check = check or (lambda result, name: result)
+        self.retryable = RETRYABLE_ERRORS + ((StructuredOutputError,) if retry_parse_failures else ())
+
+    def _hedge_delay(self, timeout: float) -> Optional[float]:
+        delay = LATENCIES.percentile(self.name) if self.hedge else None
+        return delay if delay is not None and delay < timeout else None
+
+    def _finish(self, started: float, result: Any, hedged: bool) -> Any:
+        LATENCIES.record(self.name, time.monotonic() - started)
+        if hedged:
+            _count(self.name, "hedge_wins")
+        return self.check(result, self.name)
+
+    def _attempt(self, input, config: RunnableConfig, timeout: float) -> Any:
+        cancelled = threading.Event()
+        started = time.monotonic()
+
+        def submit():
+            return _executor.submit(contextvars.copy_context().run, self.call, input, config, cancelled)
+
+        futures = [submit()]
+        try:
+            hedge_delay = self._hedge_delay(timeout)
+            if hedge_delay is not None and not wait(futures, timeout=hedge_delay).done:
+                _count(self.name, "hedges")
+                futures.append(submit())
+            error = None
+            pending = list(futures)
+            while pending:
+                done, _ = wait(pending, timeout=max(0.0, started + timeout - time.monotonic()),
+                               return_when=FIRST_COMPLETED)
+                if not done:
+                    raise CallTimeout(f"{self.name} call timed out after {timeout:.1f}s")
+                for future in done:
+                    pending.remove(future)
+                    if future.exception() is None:
+                        return self._finish(started, future.result(), future is not futures[0])
+                    error = future.exception()
+            raise error
+        finally:
+            cancelled.set()
+
+    async def _aattempt(self, input, config: RunnableConfig, timeout: float) -> Any:
+        started = time.monotonic()
+        tasks = [asyncio.ensure_future(self.acall(input, config))]
+        try:
+            hedge_delay = self._hedge_delay(timeout)
+            if hedge_delay is not None and not (await asyncio.wait(tasks, timeout=hedge_delay))[0]:
+                _count(self.name, "hedges")
+                tasks.append(asyncio.ensure_future(self.acall(input, config)))
+            error = None
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, timeout=max(0.0, started + timeout - time.monotonic()), return_when=FIRST_COMPLETED
+                )
+                if not done:
+                    raise CallTimeout(f"{self.name} call timed out after {timeout:.1f}s")
+                for task in done:
+                    if task.exception() is None:
+                        return self._finish(started, task.result(), task is not tasks[0])
+                    error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def _retry_wait(self, error: Exception, attempt: int, deadline: float) -> Optional[float]:
+        """Seconds to wait before the next attempt, or None to give up with ``error``"""
+        if not isinstance(error, self.retryable) or attempt == self.retries:
+            return None
+        delay = retry_delay(error, attempt)
+        if time.monotonic() + delay >= deadline:
+            return None
+        _count(self.name, "timeouts" if isinstance(error, CallTimeout) else "retries")
+        trace = current_trace()
+        if trace is not None:
+            trace.record_retry(current_node())
+        return delay
+
+    def _timeout(self, attempt: int, deadline: float) -> float:
+        if attempt == 0 and self.retries:
+            return self.deadline * FIRST_ATTEMPT_SHARE
+        return (deadline - time.monotonic()) / (self.retries + 1 - attempt)
+
+    def invoke(self, input, config: Optional[RunnableConfig] = None) -> Any:
+        deadline = time.monotonic() + self.deadline
+        for attempt in range(self.retries + 1):
+            timeout = self._timeout(attempt, deadline)
+            try:
+                return self._attempt(input, config, timeout)
+            except Exception as e:
+                delay = self._retry_wait(e, attempt, deadline)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+
+    async def ainvoke(self, input, config: Optional[RunnableConfig] = None) -> Any:
+        deadline = time.monotonic() + self.deadline
+        for attempt in range(self.retries + 1):
+            timeout = self._timeout(attempt, deadline)
+            try:
+                return await self._aattempt(input, config, timeout)
+            except Exception as e:
+                delay = self._retry_wait(e, attempt, deadline)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+
+    def as_runnable(self) -> Runnable:
+        return RunnableLambda(self.invoke, afunc=self.ainvoke, name=self.name)
+
+def _deadline(node: str) -> float:
+    return NODE_DEADLINES.get(node, DEFAULT_DEADLINE)
+
+def request_timeout(*nodes: str) -> float:
+    """HTTP request timeout for a client serving ``nodes`` (all nodes if none are given).
+
+    Timed-out and losing hedge attempts are abandoned, not interrupted; tying the
+    client timeout to the longest deadline makes them end at the provider too
+    instead of holding a pool thread while it stalls.
+    """
+    return max(_deadline(node) for node in nodes or NODE_DEADLINES)
+
+def resilient_structured(node: str, llm, schema: Type[BaseModel], name: Optional[str] = None,
+                         retry_parse_failures: bool = True) -> Runnable:
+    """``llm.with_structured_output(schema)`` with the node's deadline, retries and hedging.
+
+    Unparseable responses are repaired locally when possible; otherwise they
+    raise StructuredOutputError, which is retried unless ``retry_parse_failures``
+    is False (the caller then handles it, e.g. by escalating to a larger model).
+    """
+    structured = llm.with_structured_output(schema, include_raw=True)
+
+    def check(result: Dict[str, Any], name: str) -> BaseModel:
+        if result["parsed"] is not None:
+            return result["parsed"]
+        repaired = repair_structured(result["raw"], schema)
+        if repaired is None:
+            raise StructuredOutputError(f"{schema.__name__}: {result['parsing_error']}")
+        _count(name, "repairs")
+        return repaired
+
+    call = ResilientCall(
+        name or node,
+        lambda input, config, cancelled: structured.invoke(input, config),
+        structured.ainvoke,
+        _deadline(node),
+        check=check,
+        retry_parse_failures=retry_parse_failures,
+    )
+    return call.as_runnable()
+
+def resilient_text(node: str, llm, name: Optional[str] = None, stream: bool = False) -> Runnable:
+    """A plain LLM call with the node's deadline and retries, returning an AIMessage.
+
+    With ``stream`` the response is streamed, so callbacks see its tokens as
+    they arrive. Streamed calls are never hedged; a retried attempt streams
+    under a new run id, which ``graph.stream_generation`` turns into a
+    "reset" event so consumers discard the abandoned attempt's tokens.
+    """
+    if not stream:
+        return ResilientCall(
+            name or node, lambda input, config, cancelled: llm.invoke(input, config), llm.ainvoke, _deadline(node)
+        ).as_runnable()
+
+    def call(input, config, cancelled: threading.Event) -> AIMessage:
+        content = []
+        for chunk in llm.stream(input, config):
+            if cancelled.is_set():
+                break
+            content.append(chunk.content)
+        return AIMessage(content="".join(content))
+
+    async def acall(input, config) -> AIMessage:
+        return AIMessage(content="".join([chunk.content async for chunk in llm.astream(input, config)]))
+
+    return ResilientCall(name or node, call, acall, _deadline(node), hedge=False).as_runnable()
@@ -0,0 +1,150 @@
+import math
+import os
+import re
+import unicodedata
+from collections import Counter
+from functools import lru_cache
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from graph import VerifiedFact
+
+# Sentences whose best cosine similarity to a fact reaches this are auto-passed, provided
+# they add no numbers or content words the fact lacks (see novel_content)
+SUPPORTED_THRESHOLD = float(os.getenv("LOR_SUPPORT_THRESHOLD", "0.75"))
+
+NGRAM_SIZES = (2, 3)
+
+# Sentence ends: western punctuation followed by whitespace, CJK punctuation, or line breaks
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+|(?<=[。！？])|\n+")
+
+# Function words ignored when checking a sentence for content its fact lacks; negations
+# are deliberately absent so "did not build" never passes as "built"
+_STOPWORDS = frozenset("""
+a an the and or but of to in on at by for with from as into onto over under about
+is are was were be been being has have had do does did will would can could should may might
+this that these those it its he she they them his her their we our i me my you your
+who whom which what when where while also very
+""".split())
+
+_NUMBER_WORDS = frozenset("""
+zero one two three four five six seven eight nine ten eleven twelve thirteen fourteen fifteen
+sixteen seventeen eighteen nineteen twenty thirty forty fifty sixty seventy eighty ninety
+hundred thousand million billion dozen dozens first second third fourth fifth tenth
+""".split())
+
+_TOKEN = re.compile(r"[\u4e00-\u9fff]|[^\W\d_]+|\d+")
+
+def _stem(token: str) -> str:
+    for suffix in ("ing", "ed", "es", "s", "ly"):
+        if len(token) > len(suffix) + 2 and token.endswith(suffix):
+            return token[:-len(suffix)]
+    return token
+
+def _content_tokens(text: str) -> set:
+    tokens = _TOKEN.findall(unicodedata.normalize("NFKC", text).lower())
+    return {_stem(t) for t in tokens if t not in _STOPWORDS}
+
+def novel_content(sentence: str, fact_text: str) -> bool:
+    """Whether a sentence states numbers, or content words, that ``fact_text`` does not.
+
+    N-gram similarity cannot see inserted modifiers, changed numbers or negation,
+    so such sentences always go to the LLM verifier.
+    """
+    tokens = set(_TOKEN.findall(unicodedata.normalize("NFKC", sentence).lower()))
+    if re.search(r"\d", sentence) or tokens & _NUMBER_WORDS:
+        return True
+    return bool(_content_tokens(sentence) - _content_tokens(fact_text))
+
+def split_sentences(text: str) -> List[str]:
+    return [s.strip() for s in _SENTENCE_END.split(text or "") if s and s.strip()]
+
+def _normalize(text: str) -> str:
+    text = unicodedata.normalize("NFKC", text).lower()
+    return " " + re.sub(r"\s+", " ", text).strip() + " "
+
+def char_ngrams(text: str) -> Counter:
+    text = _normalize(text)
+    grams = Counter()
+    for n in NGRAM_SIZES:
+        grams.update(text[i:i + n] for i in range(len(text) - n + 1))
+    return grams
+
+class FactIndex:
+    """TF-IDF character n-gram index over fact claims and evidence.
+
+    ``similarities`` returns the cosine similarity of each sentence to each
+    fact. N-grams that appear in no fact still count towards a sentence's
+    norm, so sentences carrying new content score lower.
+    """
+
+    def __init__(self, documents: Sequence[str]):
+        doc_grams = [char_ngrams(doc) for doc in documents]
+        self.vocabulary: Dict[str, int] = {}
+        for grams in doc_grams:
+            for gram in grams:
+                self.vocabulary.setdefault(gram, len(self.vocabulary))
+
+        counts = np.zeros((len(doc_grams), len(self.vocabulary)), dtype=np.float32)
+        for row, grams in enumerate(doc_grams):
+            for gram, count in grams.items():
+                counts[row, self.vocabulary[gram]] = count
+
+        n_docs = max(len(doc_grams), 1)
+        df = (counts > 0).sum(axis=0)
+        self.idf = np.log((1 + n_docs) / (1 + df)) + 1.0
+        self.unseen_idf = math.log(1 + n_docs) + 1.0
+
+        matrix = np.log1p(counts) * self.idf
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        self.matrix = matrix / np.where(norms == 0, 1.0, norms)
+
+    def similarities(self, sentences: Sequence[str]) -> np.ndarray:
+        """Cosine similarity of every sentence (rows) to every fact (columns)"""
+        if not sentences or not self.vocabulary:
+            return np.zeros((len(sentences), self.matrix.shape[0]), dtype=np.float32)
+
+        vectors = np.zeros((len(sentences), len(self.vocabulary)), dtype=np.float32)
+        unseen_weight = np.zeros(len(sentences), dtype=np.float32)
+        for row, sentence in enumerate(sentences):
+            for gram, count in char_ngrams(sentence).items():
+                column = self.vocabulary.get(gram)
+                if column is None:
+                    unseen_weight[row] += (math.log1p(count) * self.unseen_idf) ** 2
+                else:
+                    vectors[row, column] = count
+
+        vectors = np.log1p(vectors) * self.idf
+        norms = np.sqrt((vectors ** 2).sum(axis=1) + unseen_weight)
+        return (vectors @ self.matrix.T) / np.where(norms == 0, 1.0, norms)[:, None]
+
+@lru_cache(maxsize=32)
+def _index_for(documents: Tuple[str, ...]) -> FactIndex:
+    return FactIndex(documents)
+
+def fact_index(facts: Sequence[VerifiedFact]) -> FactIndex:
+    """Index for a fact list, memoized so revise rounds reuse it"""
+    return _index_for(tuple(f"{f.claim} {f.evidence}" for f in facts))
+
+def partition_cited(sentences: Sequence[str], cited: Sequence[Optional[Sequence[int]]],
+                    facts: Sequence[VerifiedFact],
+                    threshold: float = SUPPORTED_THRESHOLD) -> Tuple[List[str], List[str]]:
+    """Split sentences into (clearly supported, needs LLM verification), where ``cited[i]``
+    lists the indices of the facts sentence i cites: cited sentences must restate those
+    facts, uncited ones may match any fact. A sentence only passes locally when
+    it is similar enough and adds no numbers or content words the facts lack."""
+    if not sentences:
+        return [], []
+    similarities = fact_index(facts).similarities(sentences)
+    texts = [f"{f.claim} {f.evidence}" for f in facts]
+    supported, ambiguous = [], []
+    for row, (sentence, indices) in enumerate(zip(sentences, cited)):
+        scores = similarities[row, list(indices)] if indices else similarities[row]
+        if not scores.size or scores.max() < threshold:
+            ambiguous.append(sentence)
+            continue
+        # Cited sentences may combine their cited facts; uncited ones must restate the best match
+        source = " ".join(texts[i] for i in indices) if indices else texts[int(scores.argmax())]
+        (ambiguous if novel_content(sentence, source) else supported).append(sentence)
+    return supported, ambiguous
@@ -0,0 +1,323 @@
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.runnables import RunnableConfig, RunnableLambda, ensure_config
+
+logger = logging.getLogger("lor.telemetry")
+
+# When set, Prometheus text metrics are rewritten here after every run
+# (suitable for the node_exporter textfile collector)
+METRICS_FILE = os.getenv("LOR_METRICS_FILE")
+
+# USD per million tokens: (input, cached input, output); matched by model name prefix
+MODEL_PRICES = {
+    "gpt-4o-mini": (0.15, 0.075, 0.60),
+    "gpt-4o": (2.50, 1.25, 10.00),
+    "gpt-4.1-mini": (0.40, 0.10, 1.60),
+    "gpt-4.1": (2.00, 0.50, 8.00),
+}
+
+# Upper bounds in seconds for the node latency histogram
+LATENCY_BUCKETS = (0.5, 1.0, 2.0, 5.0, 10.0, 20.0, 30.0, 60.0, float("inf"))
+
+def estimate_cost(model: str, prompt_tokens: int, cached_tokens: int, completion_tokens: int) -> float:
+    for prefix in sorted(MODEL_PRICES, key=len, reverse=True):
+        if model.startswith(prefix):
+            input_price, cached_price, output_price = MODEL_PRICES[prefix]
+            return ((prompt_tokens - cached_tokens) * input_price + cached_tokens * cached_price
+                    + completion_tokens * output_price) / 1_000_000
+    return 0.0
+
+@dataclass
+class NodeSpan:
+    node: str
+    iteration: int  # revision round the node ran in
+    wall_time: float = 0.0
+    error: Optional[str] = None
+
+@dataclass
+class LLMCall:
+    node: str
+    model: str = ""
+    wall_time: float = 0.0
+    prompt_tokens: int = 0
+    cached_tokens: int = 0
+    completion_tokens: int = 0
+    cost: float = 0.0
+    error: Optional[str] = None
+
+class RunTrace(BaseCallbackHandler):
+    """Per-run collector of node spans and LLM usage.
+
+    Pass ``trace.config()`` to ``graph.invoke``/``stream``: nodes wrapped with
+    ``traced_node`` record their wall time, LLM callbacks record tokens and
+    cost against the node that made the call, and resilience.py records its
+    retries through ``record_retry``. Call ``finish()``
+    once the run is over to update process metrics and emit a JSON log line.
+    """
+
+    def __init__(self, run_id: Optional[str] = None):
+        super().__init__()
+        self.run_id = run_id or uuid.uuid4().hex
+        self.spans: List[NodeSpan] = []
+        self.llm_calls: List[LLMCall] = []
+        self.events: Dict[str, int] = {}  # named counters, e.g. speculative drafting outcomes
+        self.retries: Dict[str, int] = {}  # node -> LLM call attempts retried by resilience.py
+        self.started = time.perf_counter()
+        self.wall_time = 0.0
+        self._lock = threading.Lock()
+        self._open_calls: Dict[Any, tuple] = {}
+
+    def config(self, config: Optional[RunnableConfig] = None) -> RunnableConfig:
+        config = dict(config or {})
+        config["callbacks"] = list(config.get("callbacks") or []) + [self]
+        config["configurable"] = {**(config.get("configurable") or {}), "run_trace": self}
+        return config
+
+    @contextmanager
+    def span(self, node: str, iteration: int = 0):
+        record = NodeSpan(node=node, iteration=iteration)
+        started = time.perf_counter()
+        try:
+            yield record
+        except Exception as e:
+            record.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            record.wall_time = time.perf_counter() - started
+            with self._lock:
+                self.spans.append(record)
+
+    def count(self, event: str, n: int = 1) -> None:
+        with self._lock:
+            self.events[event] = self.events.get(event, 0) + n
+
+    def record_retry(self, node: str) -> None:
+        with self._lock:
+            self.retries[node] = self.retries.get(node, 0) + 1
+
+    # LangChain callbacks
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, metadata=None, **kwargs) -> None:
+        node = (metadata or {}).get("langgraph_node", "unknown")
+        # The requested model, until the response names the exact one that served it
+        params = kwargs.get("invocation_params") or {}
+        model = params.get("model_name") or params.get("model") or ""
+        with self._lock:
+            self._open_calls[run_id] = (LLMCall(node=node, model=model), time.perf_counter())
+
+    def on_llm_end(self, response, *, run_id, **kwargs) -> None:
+        with self._lock:
+            call, started = self._open_calls.pop(run_id, (None, None))
+        if call is None:
+            return
+        call.wall_time = time.perf_counter() - started
+        for generations in response.generations:
+            for generation in generations:
+                message = getattr(generation, "message", None)
+                usage = getattr(message, "usage_metadata", None) or {}
+                call.prompt_tokens += usage.get("input_tokens", 0)
+                call.completion_tokens += usage.get("output_tokens", 0)
+                call.cached_tokens += (usage.get("input_token_details") or {}).get("cache_read", 0) or 0
+                call.model = (getattr(message, "response_metadata", None) or {}).get("model_name") or call.model
+        call.cost = estimate_cost(call.model, call.prompt_tokens, call.cached_tokens, call.completion_tokens)
+        with self._lock:
+            self.llm_calls.append(call)
+
+    def on_llm_error(self, error, *, run_id, **kwargs) -> None:
+        with self._lock:
+            call, started = self._open_calls.pop(run_id, (None, None))
+            if call is not None:
+                call.wall_time = time.perf_counter() - started
+                call.error = f"{type(error).__name__}: {error}"
+                self.llm_calls.append(call)
+
+    # Reporting
+
+    def breakdown(self) -> List[Dict[str, Any]]:
+        """One row per node: runs, wall time, LLM time, tokens, cost, retries and calls per model"""
+        rows: Dict[str, Dict[str, Any]] = {}
+
+        def row(node: str) -> Dict[str, Any]:
+            return rows.setdefault(node, {
+                "node": node, "runs": 0, "wall_time": 0.0, "llm_calls": 0, "llm_time": 0.0,
+                "prompt_tokens": 0, "cached_tokens": 0, "completion_tokens": 0,
+                "cost": 0.0, "retries": 0, "max_iteration": 0, "models": {}
+            })
+
+        with self._lock:
+            for span in self.spans:
+                r = row(span.node)
+                r["runs"] += 1
+                r["wall_time"] += span.wall_time
+                r["max_iteration"] = max(r["max_iteration"], span.iteration)
+            for call in self.llm_calls:
+                r = row(call.node)
+                r["llm_calls"] += 1
+                r["llm_time"] += call.wall_time
+                r["prompt_tokens"] += call.prompt_tokens
+                r["cached_tokens"] += call.cached_tokens
+                r["completion_tokens"] += call.completion_tokens
+                r["cost"] += call.cost
+                r["models"][call.model] = r["models"].get(call.model, 0) + 1
+            for node, count in self.retries.items():
+                row(node)["retries"] += count
+        for r in rows.values():
+            r["cache_hit_rate"] = r["cached_tokens"] / r["prompt_tokens"] if r["prompt_tokens"] else 0.0
+        return list(rows.values())
+
+    def summary(self) -> Dict[str, Any]:
+        nodes = self.breakdown()
+        prompt_tokens = sum(r["prompt_tokens"] for r in nodes)
+        cached_tokens = sum(r["cached_tokens"] for r in nodes)
+        return {
+            "run_id": self.run_id,
+            "wall_time": self.wall_time or time.perf_counter() - self.started,
+            "revisions": max((span.iteration for span in self.spans), default=0),
+            "prompt_tokens": prompt_tokens,
+            "cached_tokens": cached_tokens,
+            # Share of prompt tokens served from the provider's prompt cache
+            "cache_hit_rate": cached_tokens / prompt_tokens if prompt_tokens else 0.0,
+            "completion_tokens": sum(r["completion_tokens"] for r in nodes),
+            "cost": sum(r["cost"] for r in nodes),
+            "events": dict(self.events),
+            "nodes": nodes,
+        }
+
+    def to_json(self) -> str:
+        data = self.summary()
+        data["spans"] = [asdict(span) for span in self.spans]
+        data["llm_calls"] = [asdict(call) for call in self.llm_calls]
+        return json.dumps(data, ensure_ascii=False)
+
+    def finish(self) -> Dict[str, Any]:
+        """Close the run: record process metrics, log it as JSON and return the summary"""
+        self.wall_time = time.perf_counter() - self.started
+        METRICS.record(self)
+        logger.info(self.to_json())
+        if METRICS_FILE:
+            write_metrics_file(METRICS_FILE)
+        return self.summary()
+
+def current_trace() -> Optional[RunTrace]:
+    """RunTrace of the run the calling graph node belongs to, if one is configured"""
+    return (ensure_config().get("configurable") or {}).get("run_trace")
+
+def current_node() -> str:
+    """Name of the graph node the caller runs in"""
+    return (ensure_config().get("metadata") or {}).get("langgraph_node", "unknown")
+
+def _record_iteration(span: NodeSpan, update: Any) -> Any:
+    # A drafting node bumps revision_count itself, so its span belongs to the round it returns
+    if isinstance(update, dict) and "revision_count" in update:
+        span.iteration = update["revision_count"]
+    return update
+
+def traced_node(name: str, fn: Callable, afn: Optional[Callable] = None) -> RunnableLambda:
+    """Wrap a graph node (and optionally its async variant) so its wall time is
+    recorded on the run's RunTrace, if one is configured"""
+
+    def node(state, config: RunnableConfig):
+        trace = (config.get("configurable") or {}).get("run_trace")
+        if trace is None:
+            return fn(state)
+        with trace.span(name, state.get("revision_count", 0)) as span:
+            return _record_iteration(span, fn(state))
+
+    async def anode(state, config: RunnableConfig):
+        trace = (config.get("configurable") or {}).get("run_trace")
+        if trace is None:
+            return await afn(state)
+        with trace.span(name, state.get("revision_count", 0)) as span:
+            return _record_iteration(span, await afn(state))
+
+    return RunnableLambda(node, afunc=anode if afn is not None else None, name=name)
+
+class Metrics:
+    """Process-wide aggregates over finished runs, rendered in Prometheus text format"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.runs = 0
+        self.revisions = 0
+        self.node_count: Dict[str, int] = {}
+        self.node_seconds: Dict[str, float] = {}
+        self.node_buckets: Dict[str, List[int]] = {}
+        self.tokens: Dict[tuple, int] = {}
+        self.cost: Dict[tuple, float] = {}  # (node, model) -> USD
+        self.llm_seconds: Dict[tuple, float] = {}  # (node, model) -> seconds in LLM calls
+        self.retries: Dict[str, int] = {}
+        self.errors: Dict[str, int] = {}
+        self.events: Dict[str, int] = {}
+
+    def record(self, trace: RunTrace) -> None:
+        with self._lock:
+            self.runs += 1
+            self.revisions += max((span.iteration for span in trace.spans), default=0)
+            for span in trace.spans:
+                self.node_count[span.node] = self.node_count.get(span.node, 0) + 1
+                self.node_seconds[span.node] = self.node_seconds.get(span.node, 0.0) + span.wall_time
+                buckets = self.node_buckets.setdefault(span.node, [0] * len(LATENCY_BUCKETS))
+                for i, bound in enumerate(LATENCY_BUCKETS):
+                    if span.wall_time <= bound:
+                        buckets[i] += 1
+                if span.error:
+                    self.errors[span.node] = self.errors.get(span.node, 0) + 1
+            for call in trace.llm_calls:
+                for kind, count in (("prompt", call.prompt_tokens), ("cached", call.cached_tokens),
+                                    ("completion", call.completion_tokens)):
+                    key = (call.node, kind)
+                    self.tokens[key] = self.tokens.get(key, 0) + count
+                key = (call.node, call.model)
+                self.cost[key] = self.cost.get(key, 0.0) + call.cost
+                self.llm_seconds[key] = self.llm_seconds.get(key, 0.0) + call.wall_time
+            for node, count in trace.retries.items():
+                self.retries[node] = self.retries.get(node, 0) + count
+            for event, count in trace.events.items():
+                self.events[event] = self.events.get(event, 0) + count
+
+    def render_prometheus(self) -> str:
+        lines = [
+            "# TYPE lor_runs_total counter", f"lor_runs_total {self.runs}",
+            "# TYPE lor_revisions_total counter", f"lor_revisions_total {self.revisions}",
+            "# TYPE lor_node_seconds histogram",
+        ]
+        with self._lock:
+            for node, buckets in self.node_buckets.items():
+                for bound, count in zip(LATENCY_BUCKETS, buckets):
+                    le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                    lines.append(f'lor_node_seconds_bucket{{node="{node}",le="{le}"}} {count}')
+                lines.append(f'lor_node_seconds_sum{{node="{node}"}} {self.node_seconds[node]:.6f}')
+                lines.append(f'lor_node_seconds_count{{node="{node}"}} {self.node_count[node]}')
+            lines.append("# TYPE lor_node_errors_total counter")
+            lines.extend(f'lor_node_errors_total{{node="{n}"}} {c}' for n, c in self.errors.items())
+            lines.append("# TYPE lor_llm_tokens_total counter")
+            lines.extend(f'lor_llm_tokens_total{{node="{n}",kind="{k}"}} {c}' for (n, k), c in self.tokens.items())
+            lines.append("# TYPE lor_llm_cost_usd_total counter")
+            lines.extend(f'lor_llm_cost_usd_total{{node="{n}",model="{m}"}} {c:.6f}' for (n, m), c in self.cost.items())
+            lines.append("# TYPE lor_llm_seconds_total counter")
+            lines.extend(f'lor_llm_seconds_total{{node="{n}",model="{m}"}} {s:.6f}'
+                         for (n, m), s in self.llm_seconds.items())
+            lines.append("# TYPE lor_llm_retries_total counter")
+            lines.extend(f'lor_llm_retries_total{{node="{n}"}} {c}' for n, c in self.retries.items())
+            lines.append("# TYPE lor_events_total counter")
+            lines.extend(f'lor_events_total{{event="{e}"}} {c}' for e, c in self.events.items())
+        return "\n".join(lines) + "\n"
+
+METRICS = Metrics()
+
+def write_metrics_file(path: str) -> None:
+    # A temp file per writer, so concurrent runs never replace each other's half-written file
+    with tempfile.NamedTemporaryFile("w", encoding="utf-8", dir=os.path.dirname(os.path.abspath(path)),
+                                     prefix=os.path.basename(path), suffix=".tmp", delete=False) as f:
+        f.write(METRICS.render_prometheus())
+    os.replace(f.name, path)